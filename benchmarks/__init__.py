@@ -0,0 +1,6 @@
+"""Benchmarks of the build throughput of Urubu.
+
+The benchmarks build synthetic projects, generated by the generate
+module, and record the results as JSON that can be compared across
+commits. See run.py and compare.py.
+"""
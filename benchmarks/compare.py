@@ -0,0 +1,83 @@
+# Copyright 2026 Jan Decaluwe
+#
+# This file is part of Urubu.
+#
+# Urubu is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Urubu is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Urubu.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Compare two benchmark results.
+
+Usage: python -m benchmarks.compare base.json new.json [--threshold 0.1]
+
+Exits with status 1 when the throughput of a scenario dropped by more
+than the threshold.
+"""
+
+import sys
+import json
+import argparse
+
+
+def change(old, new):
+    if not old:
+        return 0.0
+    return (new - old) / old
+
+
+def compare(base, new, threshold=0.1, nphases=3):
+    """Print the comparison, and return the names of regressed scenarios."""
+    regressions = []
+    scenarios = dict((s['name'], s) for s in base['scenarios'])
+    print("base: {}  new: {}".format(base.get('commit'), new.get('commit')))
+    print("{:<14} {:>10} {:>10} {:>8} {:>10} {:>8}".format(
+        'scenario', 'pages/s', 'new', 'change', 'peak (MB)', 'change'))
+    for s in new['scenarios']:
+        b = scenarios.get(s['name'])
+        if b is None:
+            continue
+        speed = change(b['pages_per_sec'], s['pages_per_sec'])
+        mem = change(b['peak_rss'], s['peak_rss'])
+        flag = ''
+        if speed < -threshold:
+            regressions.append(s['name'])
+            flag = '  REGRESSION'
+        print("{:<14} {:>10.1f} {:>10.1f} {:>+7.1%} {:>10.1f} {:>+7.1%}{}".format(
+            s['name'], b['pages_per_sec'], s['pages_per_sec'], speed,
+            s['peak_rss'] / 2**20, mem, flag))
+        # phases that slowed down most
+        slower = sorted(((s['phases'][p] - b['phases'][p], p)
+                         for p in s['phases'] if p in b['phases']), reverse=True)
+        for delta, p in slower[:nphases]:
+            if delta > 0:
+                print("    {:<40} {:+.3f}s".format(p, delta))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.compare',
+                                     description=__doc__.splitlines()[0])
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="relative throughput drop that is a regression")
+    args = parser.parse_args()
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    if compare(base, new, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+# Copyright 2026 Jan Decaluwe
+#
+# This file is part of Urubu.
+#
+# Urubu is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Urubu is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Urubu.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Generate synthetic Urubu projects."""
+
+import os
+import random
+import datetime
+
+words = """lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod
+tempor incididunt ut labore et dolore magna aliqua enim ad minim veniam quis
+nostrud exercitation ullamco laboris nisi aliquip ex ea commodo consequat duis
+aute irure in reprehenderit voluptate velit esse cillum fugiat nulla pariatur
+excepteur sint occaecat cupidatat non proident sunt culpa qui officia deserunt
+mollit anim id est laborum""".split()
+
+code = '''```python
+def fib(n):
+    """Return the n-th Fibonacci number."""
+    a, b = 0, 1
+    for i in range({}):
+        a, b = b, a + b
+    return a
+```
+'''
+
+layouts = {
+    '_base.html': '''<!DOCTYPE html>
+<html>
+  <head>
+    <title>{{this.title}}</title>
+    <meta charset="utf-8">
+  </head>
+  <body>
+    <nav>
+      {% for crumb in this.breadcrumbs %}
+      <a href="{{crumb.url}}">{{crumb.title}}</a> /
+      {% endfor %}
+      {% for item in site.reflinks['/index'].content %}
+      <a href="{{item.url}}">{{item.title}}</a>
+      {% endfor %}
+    </nav>
+    {% block body %}
+    {% endblock %}
+    {% if this.prev %}<a href="{{this.prev.url}}">{{this.prev.title}}</a>{% endif %}
+    {% if this.next %}<a href="{{this.next.url}}">{{this.next.title}}</a>{% endif %}
+  </body>
+</html>
+''',
+    'page.html': '''{% extends "_base.html" %}
+{% block body %}
+<main>
+  <h1>{{this.title}}</h1>
+  {{this.toc}}
+  {{this.body}}
+  {% for tag in this.tags %}
+  <a href="/tag/{{tag}}/">{{tag}}</a>
+  {% endfor %}
+</main>
+{% endblock %}
+''',
+    'index.html': '''{% extends "_base.html" %}
+{% block body %}
+<main>
+  <h1>{{this.title}}</h1>
+  {{this.body}}
+  <ul>
+  {% for item in this.content %}
+    <li><a href="{{item.url}}">{{item.title}}</a></li>
+  {% endfor %}
+  </ul>
+  {% if this.prevpage %}<a href="{{this.prevpage.url}}">previous</a>{% endif %}
+  {% if this.nextpage %}<a href="{{this.nextpage.url}}">next</a>{% endif %}
+</main>
+{% endblock %}
+''',
+    'tag.html': '''{% extends "_base.html" %}
+{% block body %}
+<main>
+  <h1>{{this.tag}}</h1>
+  <ul>
+  {% for item in this.content %}
+    <li><a href="{{item.url}}">{{item.title}}</a></li>
+  {% endfor %}
+  </ul>
+</main>
+{% endblock %}
+''',
+}
+
+
+def get_folders(depth, fanout):
+    """Return the folders of a tree, as tuples of path components."""
+    folders = [()]
+    level = [()]
+    for d in range(depth):
+        level = [f + ('f{}'.format(i),) for f in level for i in range(fanout)]
+        folders.extend(level)
+    return folders
+
+
+def make_text(rnd, n):
+    return ' '.join(rnd.choice(words) for i in range(n))
+
+
+def write(path, fn, text):
+    fn = os.path.join(path, fn)
+    os.makedirs(os.path.dirname(fn), exist_ok=True)
+    with open(fn, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def generate(path, pages=1000, depth=2, fanout=4, tags=20, reflinks=3,
+             code_blocks=1, sections=3, paragraphs=3, items_per_page=10,
+             seed=0):
+    """Generate a project with the given number of pages in path.
+
+    The pages are spread over the leaf folders of a tree with the given
+    depth and fanout. Folders alternate between an explicit 'content'
+    list and an 'order' by date. Each page has some tags, sections,
+    code blocks and reference links to other pages and their sections.
+    The root index is paginated.
+    """
+    rnd = random.Random(seed)
+    folders = get_folders(depth, fanout)
+    leaves = [f for f in folders if len(f) == depth]
+    tagnames = ['tag{}'.format(i) for i in range(tags)]
+    pagenames = {}
+    for i in range(pages):
+        folder = leaves[i % len(leaves)]
+        pagenames.setdefault(folder, []).append('page{}'.format(i))
+    ids = ['/' + '/'.join(folder + (name,))
+           for folder in leaves for name in pagenames.get(folder, [])]
+    start = datetime.date(2000, 1, 1)
+
+    write(path, '_site.yml', 'title: Benchmark\nreflinks:\n'
+          '    urubu:\n        url: http://urubu.jandecaluwe.com\n'
+          '        title: Urubu\n')
+    for fn, text in layouts.items():
+        write(path, os.path.join('_layouts', fn), text)
+
+    for folder in folders:
+        if len(folder) < depth:
+            children = ['f{}'.format(i) for i in range(fanout)]
+        else:
+            children = pagenames.get(folder, [])
+        meta = ['title: {}'.format(folder[-1] if folder else 'Home'),
+                'layout: index']
+        if len(folder) % 2 == 0:
+            meta.append('content:')
+            meta.extend('    - {}'.format(c) for c in children)
+        else:
+            # folders have no date
+            if len(folder) == depth:
+                meta.append('order: date')
+                meta.append('reverse: true')
+            else:
+                meta.append('order: title')
+        if not folder:
+            meta.append('items_per_page: {}'.format(items_per_page))
+            meta.append('items_index: this')
+        text = '---\n{}\n---\n\n{}\n'.format('\n'.join(meta), make_text(rnd, 30))
+        write(path, os.path.join(*(folder + ('index.md',))), text)
+
+    for folder in leaves:
+        for i, name in enumerate(pagenames.get(folder, [])):
+            date = start + datetime.timedelta(days=rnd.randrange(7000))
+            pagetags = rnd.sample(tagnames, min(3, len(tagnames)))
+            meta = ['title: {} {}'.format(name, make_text(rnd, 3)),
+                    'layout: page',
+                    'date: {}'.format(date.isoformat()),
+                    'tags: [{}]'.format(', '.join(pagetags))]
+            body = []
+            for s in range(sections):
+                body.append('## Section {}\n'.format(s))
+                for p in range(paragraphs):
+                    links = []
+                    for r in range(reflinks if p == 0 else 0):
+                        ref = rnd.choice(ids)
+                        if rnd.random() < 0.5:
+                            ref += '#section-{}'.format(rnd.randrange(sections))
+                        links.append('[{}]'.format(ref))
+                    text = make_text(rnd, 60)
+                    if links:
+                        # separated, so that they are not taken as [text][ref]
+                        text += ' ' + ', '.join(links)
+                    body.append(text + '\n')
+                if s < code_blocks:
+                    body.append(code.format(s + 1))
+            text = '---\n{}\n---\n\n{}'.format('\n'.join(meta), '\n'.join(body))
+            write(path, os.path.join(*(folder + (name + '.md',))), text)
+    return len(ids)
@@ -0,0 +1,164 @@
+# Copyright 2026 Jan Decaluwe
+#
+# This file is part of Urubu.
+#
+# Urubu is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Urubu is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Urubu.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Run the build benchmarks and record the results as JSON.
+
+Usage: python -m benchmarks.run [--pages 250,1000,4000] [-o results.json]
+
+Each build runs in a separate process, so that its peak memory can be
+measured. For each project size, the clean build and a rebuild without
+changes are timed, and the best of the repeated runs is kept. Each
+clean build starts without the persistent caches of the project, so
+that the runs are comparable.
+"""
+
+import os, sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+
+from benchmarks.generate import generate
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_child(path, jobs):
+    """Build a project in the current process, and print the results."""
+    from urubu import project
+    from urubu.config import profilefn
+    os.chdir(path)
+    results = {}
+    for name, clean in (('build', True), ('rebuild', False)):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(sys.stderr):
+            project.build(clean=clean, jobs=jobs, profile=True)
+        wall = time.perf_counter() - start
+        with open(profilefn) as f:
+            report = json.load(f)
+        os.remove(profilefn)
+        results[name] = {
+            'wall': wall,
+            'phases': dict((p['name'], p['wall']) for p in report['phases']),
+            'rendered': report['steps'].get('render', {}).get('pages', 0),
+        }
+        results['peak_rss'] = report['peak_memory']
+    print(json.dumps(results))
+
+
+def run_build(path, jobs):
+    cmd = [sys.executable, '-m', 'benchmarks.run', '--child', path,
+           '--jobs', str(jobs)]
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.dirname(here)] + env.get('PYTHONPATH', '').split(os.pathsep))
+    out = subprocess.run(cmd, env=env, check=True, stdout=subprocess.PIPE,
+                         stderr=subprocess.DEVNULL).stdout
+    return json.loads(out)
+
+
+def run_scenario(pages, options, jobs, repeat, workdir):
+    path = os.path.join(workdir, 'pages{}'.format(pages))
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    npages = generate(path, pages=pages, **options)
+    runs = [run_build(path, jobs) for i in range(repeat)]
+    best = min(runs, key=lambda r: r['build']['wall'])
+    rendered = best['build']['rendered']
+    return {'name': 'pages={}'.format(pages),
+            'pages': npages,
+            'rendered': rendered,
+            'wall': best['build']['wall'],
+            'pages_per_sec': rendered / best['build']['wall'],
+            'rebuild_wall': min(r['rebuild']['wall'] for r in runs),
+            'peak_rss': max(r['peak_rss'] or 0 for r in runs),
+            'phases': best['build']['phases']}
+
+
+def get_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=here, check=True,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              universal_newlines=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(results):
+    print("{:<14} {:>8} {:>9} {:>10} {:>11} {:>10}".format(
+        'scenario', 'pages', 'wall (s)', 'pages/s', 'rebuild (s)', 'peak (MB)'))
+    for r in results['scenarios']:
+        print("{:<14} {:>8} {:>9.2f} {:>10.1f} {:>11.2f} {:>10.1f}".format(
+            r['name'], r['rendered'], r['wall'], r['pages_per_sec'],
+            r['rebuild_wall'], r['peak_rss'] / 2**20))
+    scenarios = results['scenarios']
+    if len(scenarios) > 1:
+        # with linear scaling, the time per page stays the same
+        first, last = scenarios[0], scenarios[-1]
+        ratio = first['pages_per_sec'] / last['pages_per_sec']
+        print("Time per page grows {:.2f}x from {} to {} pages".format(
+            ratio, first['rendered'], last['rendered']))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run',
+                                     description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', default='250,1000,4000',
+                        help="comma separated project sizes")
+    parser.add_argument('--depth', type=int, default=2)
+    parser.add_argument('--fanout', type=int, default=4)
+    parser.add_argument('--tags', type=int, default=20)
+    parser.add_argument('--reflinks', type=int, default=3)
+    parser.add_argument('--code-blocks', type=int, default=1)
+    parser.add_argument('--items-per-page', type=int, default=10)
+    parser.add_argument('-j', '--jobs', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('-o', '--output', default='benchmark.json')
+    parser.add_argument('--workdir', help="directory for the generated projects")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return run_child(args.child, args.jobs)
+    options = {'depth': args.depth, 'fanout': args.fanout, 'tags': args.tags,
+               'reflinks': args.reflinks, 'code_blocks': args.code_blocks,
+               'items_per_page': args.items_per_page}
+    workdir = args.workdir or tempfile.mkdtemp(prefix='urubu-bench-')
+    try:
+        scenarios = [run_scenario(int(n), options, args.jobs, args.repeat, workdir)
+                     for n in args.pages.split(',')]
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir)
+    results = {'commit': get_commit(),
+               'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'jobs': args.jobs,
+               'options': options,
+               'scenarios': scenarios}
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print_summary(results)
+    print("Results written to {}".format(args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -35,6 +35,9 @@ class UrubuError(Exception):
         self.kind = kind
         self.msg = msg
         self.fn = fn 
+    def __reduce__(self):
+        # keep all attributes when passed between processes
+        return (self.__class__, (self.kind, self.msg, self.fn))
     def __str__(self):
         fn = self.fn 
         if fn:
@@ -65,3 +68,5 @@ _error.undef_content = "No 'content' or 'order' specified"
 _error.undef_reflink_key = "Undefined key in site reflink"
 _error.ambig_ref_md = 'Ambiguous reference' 
 _error.no_index = 'Missing index file'
+_error.invalid_value = 'Invalid value'
+_error.search_dir = 'Folder exists, and is not a search index'
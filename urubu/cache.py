@@ -0,0 +1,180 @@
+# Copyright 2026 Jan Decaluwe
+#
+# This file is part of Urubu.
+#
+# Urubu is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Urubu is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Urubu.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import hashlib
+import tempfile
+import collections
+
+
+def make_key(*parts):
+    """Return a cache key for a sequence of strings."""
+    h = hashlib.sha1()
+    for part in parts:
+        data = part.encode('utf-8')
+        # length prefix, so that different splits give different keys
+        h.update(str(len(data)).encode('ascii') + b':' + data)
+    return h.hexdigest()
+
+
+class MemoryCache(object):
+
+    """In-memory cache with least recently used eviction.
+
+    The total size of the values, as given when they are added, is
+    kept below maxsize.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.size = 0
+        self.items = collections.OrderedDict()
+
+    def get(self, key):
+        item = self.items.get(key)
+        if item is None:
+            return None
+        self.items.move_to_end(key)
+        return item[0]
+
+    def put(self, key, value, size):
+        if size > self.maxsize:
+            return
+        if key in self.items:
+            self.size -= self.items.pop(key)[1]
+        self.items[key] = (value, size)
+        self.size += size
+        while self.size > self.maxsize:
+            key, (value, size) = self.items.popitem(last=False)
+            self.size -= size
+
+
+class DiskCache(object):
+
+    """Persistent cache of byte strings in a directory.
+
+    Each value is stored in its own file. Reading a value marks it as
+    recently used. When the total size of the files exceeds maxsize,
+    the least recently used files are removed. Writes are atomic, so
+    that several processes can share a cache.
+    """
+
+    def __init__(self, path, maxsize):
+        self.path = path
+        self.maxsize = maxsize
+        # total size of the files, scanned on the first write
+        self.size = None
+
+    def get_fn(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def get(self, key):
+        fn = self.get_fn(key)
+        try:
+            with open(fn, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(fn)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.maxsize:
+            return
+        fn = self.get_fn(key)
+        dirname = os.path.dirname(fn)
+        try:
+            os.makedirs(dirname, exist_ok=True)
+            fd, tmpfn = tempfile.mkstemp(dir=dirname)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmpfn, fn)
+        except OSError:
+            # a cache is never essential
+            return
+        if self.size is None:
+            self.size = sum(size for mtime, size, fn in self.scan())
+        else:
+            self.size += len(data)
+        if self.size > self.maxsize:
+            self.evict()
+
+    def scan(self):
+        files = []
+        for dirpath, dirnames, filenames in os.walk(self.path):
+            for fn in filenames:
+                p = os.path.join(dirpath, fn)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, p))
+        return files
+
+    def evict(self):
+        """Remove the least recently used files, down to 3/4 of maxsize."""
+        files = sorted(self.scan())
+        self.size = sum(size for mtime, size, fn in files)
+        for mtime, size, fn in files:
+            if self.size <= self.maxsize * 3 // 4:
+                break
+            try:
+                os.remove(fn)
+            except OSError:
+                continue
+            self.size -= size
+
+
+class Cache(object):
+
+    """Two-level cache: in memory, backed by a persistent disk cache.
+
+    Values are converted to bytes for the disk cache with dumps and
+    loads. Without a path, only the memory cache is used.
+    """
+
+    def __init__(self, path, memsize, disksize, dumps, loads):
+        self.memory = MemoryCache(memsize)
+        self.disk = None
+        if path is not None:
+            self.disk = DiskCache(path, disksize)
+        self.dumps = dumps
+        self.loads = loads
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None or self.disk is None:
+            return value
+        data = self.disk.get(key)
+        if data is None:
+            return None
+        try:
+            value = self.loads(data)
+        except Exception:
+            # e.g. a truncated or incompatible file
+            return None
+        self.memory.put(key, value, len(data))
+        return value
+
+    def put(self, key, value):
+        data = self.dumps(value)
+        self.memory.put(key, value, len(data))
+        if self.disk is not None:
+            self.disk.put(key, data)
@@ -0,0 +1,102 @@
+# Copyright 2026 Jan Decaluwe
+#
+# This file is part of Urubu.
+#
+# Urubu is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Urubu is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Urubu.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import gzip
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from urubu.manifest import hash_file
+from urubu.sync import protected
+
+
+class Precompressor(object):
+
+    """Write gzip compressed siblings of the files in a site directory.
+
+    Files below min_size, with an extension in skip_exts, or that don't
+    get smaller, are not compressed. The compression is deterministic,
+    so that a compressed file only changes with its source. Compressed
+    files are written in a thread pool, as zlib releases the GIL.
+    """
+
+    def __init__(self, sitedir, min_size, skip_exts, level=9, jobs=None):
+        self.sitedir = sitedir
+        self.min_size = min_size
+        self.skip_exts = skip_exts
+        self.level = level
+        self.jobs = jobs
+
+    def scan(self):
+        """Return the files to compress."""
+        files = []
+        for dirpath, dirnames, filenames in os.walk(self.sitedir):
+            reldir = os.path.relpath(dirpath, self.sitedir)
+            if reldir == os.curdir:
+                reldir = ''
+                dirnames[:] = [d for d in dirnames if d not in protected]
+            for fn in filenames:
+                # e.g. the build manifest
+                if fn.startswith('.'):
+                    continue
+                if os.path.splitext(fn)[1].lower() in self.skip_exts:
+                    continue
+                relfn = os.path.join(reldir, fn)
+                if os.path.getsize(os.path.join(dirpath, fn)) < self.min_size:
+                    continue
+                files.append(relfn)
+        return sorted(files)
+
+    def compress_file(self, relfn, prevhash=None):
+        """Compress a file, unless its source hash is unchanged.
+
+        Return the source hash, or None if the file is not compressed.
+        """
+        src = os.path.join(self.sitedir, relfn)
+        dst = src + '.gz'
+        h = hash_file(src)
+        if h == prevhash and os.path.isfile(dst):
+            return h
+        with open(src, 'rb') as f:
+            data = f.read()
+        gz = gzip.compress(data, compresslevel=self.level, mtime=0)
+        if len(gz) >= len(data):
+            if os.path.isfile(dst):
+                os.remove(dst)
+            return None
+        with open(dst, 'wb') as f:
+            f.write(gz)
+        shutil.copystat(src, dst)
+        return h
+
+    def compress(self, prev):
+        """Compress the files of the site.
+
+        prev maps the files that were compressed before to their source
+        hash. Return the same mapping for the current files.
+        """
+        files = self.scan()
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            hashes = list(pool.map(lambda relfn: self.compress_file(relfn, prev.get(relfn)),
+                                   files))
+        records = dict((relfn, h) for relfn, h in zip(files, hashes) if h is not None)
+        # compressed files of sources that have gone
+        for relfn in prev:
+            dst = os.path.join(self.sitedir, relfn) + '.gz'
+            if relfn not in records and os.path.isfile(dst):
+                os.remove(dst)
+        return records
@@ -19,6 +19,33 @@ import os
 
 siteinfofn = '_site.yml'
 sitedir = '_build'
+manifestfn = '.urubu_manifest.json'
+# max number of source characters kept in memory after discovery
+source_cache_size = 64 * 1024 * 1024
+# number of threads that read the content files during discovery
+discovery_threads = 8
+# build profile report, and the number of slowest pages per step
+profilefn = '_profile.json'
+profile_slowest = 10
+# persistent caches, in the project directory
+cachedir = '.urubu_cache'
+# memory and disk size of the cache of compiled in-page templates
+template_cache_size = 8 * 1024 * 1024
+template_cache_disk_size = 32 * 1024 * 1024
+# memory and disk size of the cache of markdown conversions
+markdown_cache_size = 32 * 1024 * 1024
+markdown_cache_disk_size = 256 * 1024 * 1024
+# memory and disk size of the cache of highlighted code blocks
+highlight_cache_size = 8 * 1024 * 1024
+highlight_cache_disk_size = 64 * 1024 * 1024
+# precompressed site files: the minimum size, and the extensions of
+# files that are compressed already
+precompress_min_size = 1024
+precompress_skip = ('.gz', '.zip', '.bz2', '.xz', '.7z', '.br', '.zst',
+                    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif',
+                    '.woff', '.woff2', '.mp3', '.mp4', '.ogg', '.webm', '.pdf')
+# files from this size on are sent with sendfile by the server
+sendfile_threshold = 64 * 1024
 tagdir = 'tag'
 tagid = '/' + tagdir
 tagindexid = tagid + '/' + 'index'
@@ -26,3 +53,9 @@ tag_layout = 'tag'
 layoutdir = '_layouts'
 tipuesearchdir = 'tipuesearch'
 tipuesearch_content = 'tipuesearch_content.json'
+# sharded search index
+searchindexdir = 'search'
+searchindex_meta = 'index.json'
+searchindex_loader = 'search.js'
+searchindex_prefix_length = 2
+searchindex_text_limit = 200
@@ -15,45 +15,248 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with Urubu.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
+import shutil
+import datetime
+import email.utils
+import urllib.parse
 import http.server as httpserver
+from http import HTTPStatus
+
+from urubu.config import sendfile_threshold
+
+
+def get_etag(st, suffix=''):
+    """Return an entity tag for a file, from its modification time and size."""
+    return '"{:x}-{:x}{}"'.format(st.st_mtime_ns, st.st_size, suffix)
+
+
+def accepts_gzip(accept_encoding):
+    """Return True if an Accept-Encoding header value accepts gzip."""
+    for coding in accept_encoding.split(','):
+        name, _, params = coding.partition(';')
+        if name.strip().lower() not in ('gzip', '*'):
+            continue
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def parse_range(value, size):
+    """Return the (start, length) of a single byte range, or None.
+
+    Multiple ranges are not supported, and are ignored like an invalid
+    range header. A range that cannot be satisfied gives a length of 0.
+    """
+    unit, _, spec = value.partition('=')
+    if unit.strip() != 'bytes' or ',' in spec:
+        return None
+    first, sep, last = spec.strip().partition('-')
+    if not sep:
+        return None
+    try:
+        if not first:
+            # suffix range: the last bytes of the file
+            n = int(last)
+            if n <= 0:
+                return (size, 0)
+            start = max(size - n, 0)
+            return (start, size - start)
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return (size, 0)
+    if start > end:
+        return None
+    return (start, min(end, size - 1) - start + 1)
+
 
 class AliasingHTTPRequestHandler(httpserver.SimpleHTTPRequestHandler):
+
+    """Request handler for a site under a baseurl.
+
+    Connections are kept alive. Responses carry validators for
+    conditional requests, support single byte ranges, and use a
+    precompressed .gz sibling of a file when the client accepts it.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
     def do_GET(self):
+        if self.alias():
+            httpserver.SimpleHTTPRequestHandler.do_GET(self)
+
+    def do_HEAD(self):
+        if self.alias():
+            httpserver.SimpleHTTPRequestHandler.do_HEAD(self)
+
+    def alias(self):
+        """Translate the path for the baseurl.
+
+        Return True if the request should be served, or False if a
+        redirect has been sent.
+        """
         baseurl = self.server.baseurl
 
         if not baseurl:
-            httpserver.SimpleHTTPRequestHandler.do_GET(self)
-            return
+            return True
 
         wk_baseurl = "/%s/" % (baseurl)
 
         if self.path == wk_baseurl[:-1]:
             # handle /$baseurl -> /$baseurl/
-
-            self.send_response(301, 'Moved Permanently')
-            self.send_header('Location', wk_baseurl)
-            self.end_headers()
-            return
+            self.send_redirect(301, 'Moved Permanently', wk_baseurl)
+            return False
 
         if self.path[:len(wk_baseurl)] == wk_baseurl:
             # translate /$baseurl/path internally to /path and serve
-
             self.path = self.path[len(wk_baseurl)-1:]
-            httpserver.SimpleHTTPRequestHandler.do_GET(self)
-            return
+            return True
         else:
             # handle /xyz/path -> /$baseurl/xyz/path
             #
             # usually caused by underlying server sending a redirect
             # to non-baseurl-prefixed path
-
-            self.send_response(302, 'Moved Temporarily')
             sep = "/" if self.path[0] != "/" else ""
 
             # note this replicates underlying bugs in that Location is
             # not absolute as required by the spec and we throw away
             # '?' and '#'
+            self.send_redirect(302, 'Moved Temporarily',
+                               "/%s%s%s" % (baseurl, sep, self.path))
+            return False
 
-            self.send_header('Location', "/%s%s%s" % (baseurl, sep, self.path))
+    def send_redirect(self, code, message, location):
+        self.send_response(code, message)
+        self.send_header('Location', location)
+        # an empty body, to keep the connection alive
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def send_head(self):
+        """Send the response headers, and return the file to send, if any."""
+        self.range = None
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            if not urllib.parse.urlsplit(self.path).path.endswith('/'):
+                # the base class redirects to the directory
+                return httpserver.SimpleHTTPRequestHandler.send_head(self)
+            for index in "index.html", "index.htm":
+                index = os.path.join(path, index)
+                if os.path.isfile(index):
+                    path = index
+                    break
+            else:
+                return self.list_directory(path)
+        if path.endswith("/") or not os.path.isfile(path):
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+        ctype = self.guess_type(path)
+        # serve a precompressed sibling, if the client accepts it
+        gzpath = path + '.gz'
+        has_gz = not path.endswith('.gz') and os.path.isfile(gzpath)
+        gzipped = has_gz and accepts_gzip(self.headers.get('Accept-Encoding', ''))
+        try:
+            f = open(gzpath if gzipped else path, 'rb')
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+        try:
+            st = os.fstat(f.fileno())
+            etag = get_etag(st, '-gzip' if gzipped else '')
+            last_modified = self.date_time_string(st.st_mtime)
+            if self.is_not_modified(etag, st.st_mtime):
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", last_modified)
+                self.end_headers()
+                f.close()
+                return None
+            size = st.st_size
+            start, length = 0, size
+            byterange = None
+            if 'Range' in self.headers and self.is_current(etag, last_modified):
+                byterange = parse_range(self.headers['Range'], size)
+            if byterange is not None and byterange[1] == 0:
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header("Content-Range", "bytes */{}".format(size))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                f.close()
+                return None
+            if byterange is not None:
+                start, length = byterange
+                self.send_response(HTTPStatus.PARTIAL_CONTENT)
+                self.send_header("Content-Range", "bytes {}-{}/{}".format(
+                    start, start + length - 1, size))
+            else:
+                self.send_response(HTTPStatus.OK)
+            self.send_header("Content-type", ctype)
+            if gzipped:
+                self.send_header("Content-Encoding", "gzip")
+            if has_gz:
+                self.send_header("Vary", "Accept-Encoding")
+            self.send_header("Content-Length", str(length))
+            self.send_header("Last-Modified", last_modified)
+            self.send_header("ETag", etag)
+            self.send_header("Accept-Ranges", "bytes")
             self.end_headers()
+            self.range = (start, length)
+            return f
+        except:
+            f.close()
+            raise
+
+    def is_not_modified(self, etag, mtime):
+        """Return True if the client has the current version of a file."""
+        if 'If-None-Match' in self.headers:
+            tags = [t.strip() for t in self.headers['If-None-Match'].split(',')]
+            # weak comparison
+            tags = [t[2:] if t.startswith('W/') else t for t in tags]
+            return '*' in tags or etag in tags
+        if 'If-Modified-Since' in self.headers:
+            try:
+                ims = email.utils.parsedate_to_datetime(self.headers['If-Modified-Since'])
+            except (TypeError, IndexError, OverflowError, ValueError):
+                # ignore ill-formed values
+                return False
+            if ims.tzinfo is None:
+                ims = ims.replace(tzinfo=datetime.timezone.utc)
+            # remove microseconds, like in If-Modified-Since
+            last_modif = datetime.datetime.fromtimestamp(int(mtime), datetime.timezone.utc)
+            return last_modif <= ims
+        return False
+
+    def is_current(self, etag, last_modified):
+        """Return True unless an If-Range header names an older version."""
+        if_range = self.headers.get('If-Range')
+        if if_range is None:
+            return True
+        return if_range.strip() in (etag, last_modified)
+
+    def copyfile(self, source, outputfile):
+        """Copy the requested range of a file to the client."""
+        if self.range is None:
+            # e.g. a directory listing
+            httpserver.SimpleHTTPRequestHandler.copyfile(self, source, outputfile)
+            return
+        start, length = self.range
+        if length >= sendfile_threshold:
+            # let the kernel copy large files, with a fallback to send
+            self.wfile.flush()
+            self.connection.sendfile(source, start, length)
             return
+        source.seek(start)
+        while length > 0:
+            data = source.read(min(length, shutil.COPY_BUFSIZE))
+            if not data:
+                break
+            outputfile.write(data)
+            length -= len(data)
@@ -0,0 +1,162 @@
+# Copyright 2026 Jan Decaluwe
+#
+# This file is part of Urubu.
+#
+# Urubu is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Urubu is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Urubu.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import json
+import pickle
+import sqlite3
+from contextlib import closing
+
+from urubu import __version__
+from urubu import readers
+from urubu.manifest import hash_data
+
+# bump when the layout of the index changes
+index_version = 2
+
+schema = '''
+create table if not exists state (key text primary key, value text);
+create table if not exists files (fn text primary key, mtime_ns integer,
+                                  size integer, pos integer, meta blob);
+create table if not exists reflinks (id text primary key, fn text,
+                                     title text, url text);
+create table if not exists tags (tag text, id text);
+create index if not exists tags_tag on tags (tag);
+'''
+
+
+def get_inputs():
+    """Return a hash of the inputs of frontmatter parsing, besides the files."""
+    inputs = [__version__, readers.yaml.__version__, readers.SafeLoader.__name__]
+    return hash_data(json.dumps(inputs).encode('utf-8'))
+
+
+class ProjectIndex(object):
+
+    """Persistent index of the content of a project, in SQLite.
+
+    The files table keeps the frontmatter and the body position of each
+    content file, with the modification time and size of the file. They
+    are reused while those are unchanged, so that unchanged files are
+    not read again. File info is still made from the frontmatter on each
+    discovery, so that hooks and validators run for every file. The
+    reflinks and tags tables hold the reflink map and the tag membership
+    of the project, so that other tools can query them directly.
+    """
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.inputs = None
+        # whether the index was made with the same inputs
+        self.current = False
+        self.files = {}
+        # hash of the reflinks and tags tables
+        self.content = None
+
+    def connect(self):
+        con = sqlite3.connect(self.fn)
+        if con.execute('pragma user_version').fetchone()[0] != index_version:
+            with con:
+                for table in ('state', 'files', 'reflinks', 'tags'):
+                    con.execute('drop table if exists ' + table)
+            con.execute('pragma user_version = {}'.format(index_version))
+        with con:
+            con.executescript(schema)
+        return con
+
+    def load(self, inputs):
+        """Load the file records, if the index is current."""
+        self.inputs = inputs
+        self.current = False
+        self.files = {}
+        self.content = None
+        if not os.path.isfile(self.fn):
+            return
+        try:
+            with closing(self.connect()) as con:
+                state = dict(con.execute('select key, value from state'))
+                self.content = state.get('content')
+                if state.get('inputs') != inputs:
+                    return
+                for fn, mtime_ns, size, pos, meta in con.execute('select * from files'):
+                    self.files[fn] = (mtime_ns, size, pos, meta)
+        except sqlite3.Error:
+            # an index is never essential
+            self.files = {}
+            return
+        self.current = True
+
+    def get(self, fn, st):
+        """Return the frontmatter and body position of a file, or None."""
+        record = self.files.get(fn)
+        if record is None or record[:2] != (st.st_mtime_ns, st.st_size):
+            return None
+        # a new copy, as the frontmatter may be modified
+        return pickle.loads(record[3]), record[2]
+
+    def update(self, changed, fns, reflinks, tagmap):
+        """Update the index after discovery.
+
+        changed maps the new or changed files to their (st, pos, meta)
+        records, and fns is the set of all content files. Only the
+        tables whose content changed are written.
+        """
+        removed = [fn for fn in self.files if fn not in fns]
+        files_changed = not self.current or changed or removed
+        reflink_rows = sorted((id, info.get('fn'), str(info.get('title')), info.get('url'))
+                              for id, info in reflinks.items())
+        tag_rows = sorted((tag, info['id']) for tag, infos in tagmap.items() for info in infos)
+        content = hash_data(json.dumps([reflink_rows, tag_rows]).encode('utf-8'))
+        if not files_changed and content == self.content:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.fn), exist_ok=True)
+            with closing(self.connect()) as con, con:
+                if not self.current:
+                    con.execute('delete from files')
+                    con.execute("insert or replace into state values ('inputs', ?)",
+                                (self.inputs,))
+                con.executemany('delete from files where fn = ?',
+                                [(fn,) for fn in removed])
+                con.executemany('insert or replace into files values (?, ?, ?, ?, ?)',
+                    [(fn, st.st_mtime_ns, st.st_size, pos, meta)
+                     for fn, (st, pos, meta) in changed.items()])
+                if content != self.content:
+                    con.execute('delete from reflinks')
+                    con.executemany('insert into reflinks values (?, ?, ?, ?)', reflink_rows)
+                    con.execute('delete from tags')
+                    con.executemany('insert into tags values (?, ?)', tag_rows)
+                    con.execute("insert or replace into state values ('content', ?)",
+                                (content,))
+        except (OSError, sqlite3.Error):
+            return
+        self.current = True
+        self.content = content
+        for fn in removed:
+            del self.files[fn]
+        for fn, (st, pos, meta) in changed.items():
+            self.files[fn] = (st.st_mtime_ns, st.st_size, pos, meta)
+
+    def find_reflinks(self, prefix=''):
+        """Return the (id, title, url) of the reflinks starting with prefix."""
+        if not os.path.isfile(self.fn):
+            return []
+        # escape the like wildcards in the prefix
+        pattern = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        with closing(self.connect()) as con:
+            return con.execute("select id, title, url from reflinks where id like ? escape '\\' "
+                               "order by id", (pattern,)).fetchall()
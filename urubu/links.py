@@ -0,0 +1,195 @@
+# Copyright 2026 Jan Decaluwe
+#
+# This file is part of Urubu.
+#
+# Urubu is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Urubu is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Urubu.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import re
+import html
+import posixpath
+import urllib.parse
+
+from urubu.sync import compile_patterns
+
+# the attributes that link to other files, per element
+link_attrs = {'a': 'href', 'area': 'href', 'link': 'href',
+              'img': 'src', 'script': 'src', 'iframe': 'src',
+              'source': 'src', 'embed': 'src', 'audio': 'src',
+              'video': 'src', 'track': 'src'}
+
+# comments and start tags; the content of raw elements is skipped
+token_re = re.compile(r'''<!--.*?-->|<([a-zA-Z][^\s/>]*)((?:[^>"']|"[^"]*"|'[^']*')*)>''', re.S)
+attr_re = re.compile(r'''([^\s=/>"']+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>"']+)))?''')
+raw_end_res = {'script': re.compile(r'</script', re.I),
+               'style': re.compile(r'</style', re.I)}
+
+
+def scan_html(text):
+    """Return the links and the anchor ids of a html page.
+
+    The page is tokenized in a single pass, only parsing the attributes
+    of tags that may have a link or an anchor. Links are returned with
+    their line number. Anchors are the id attributes of all elements,
+    and the name attributes of a elements.
+    """
+    links = []
+    ids = []
+    pos = 0
+    # line number at a position, counted as we go
+    line, linepos = 1, 0
+    while True:
+        m = token_re.search(text, pos)
+        if m is None:
+            break
+        pos = m.end()
+        tag = m.group(1)
+        if tag is None:
+            continue
+        tag = tag.lower()
+        attrs = m.group(2)
+        if '=' in attrs:
+            link_attr = link_attrs.get(tag)
+            for a in attr_re.finditer(attrs):
+                name = a.group(1).lower()
+                if name == link_attr:
+                    line += text.count('\n', linepos, m.start())
+                    linepos = m.start()
+                    value = get_value(a)
+                    if value is not None:
+                        links.append((line, value))
+                elif name == 'id' or (name == 'name' and tag == 'a'):
+                    value = get_value(a)
+                    if value is not None:
+                        ids.append(value)
+        if tag in raw_end_res:
+            e = raw_end_res[tag].search(text, pos)
+            pos = len(text) if e is None else e.start()
+    return links, ids
+
+
+def get_value(m):
+    """Return the unescaped value of an attribute match, or None."""
+    for value in m.group(2, 3, 4):
+        if value is not None:
+            return html.unescape(value)
+    return None
+
+
+def scan_file(fn):
+    """Return the links and anchor ids of a html file."""
+    with open(fn, encoding='utf-8', errors='replace') as f:
+        return scan_html(f.read())
+
+
+class LinkChecker(object):
+
+    """Check the internal links of the html pages of a built site.
+
+    The pages are scanned in a process pool. Each link is resolved
+    against the files in the site, and its fragment against the anchor
+    ids of the target page. Absolute paths should start with the
+    baseurl. A link without extension may refer to a page with the
+    file extension of the site, and a link to a directory to its index
+    page. Links with a scheme or a host are external, and not checked.
+    Folders that match the ignore patterns, such as a .git folder, are
+    not part of the site.
+    """
+
+    def __init__(self, sitedir, baseurl=None, file_ext='.html', jobs=1,
+                 ignore_patterns=('.?*',)):
+        self.sitedir = sitedir
+        self.ignore = compile_patterns(ignore_patterns)
+        self.prefix = '/' + baseurl if baseurl else ''
+        self.file_ext = file_ext
+        self.jobs = jobs
+        self.files = set()
+        self.ids = {}
+
+    def scan(self):
+        """Find the files in the site, and scan the html pages."""
+        for dirpath, dirnames, filenames in os.walk(self.sitedir):
+            reldir = os.path.relpath(dirpath, self.sitedir)
+            # prune ignored folders, by name or by path
+            dirnames[:] = [d for d in dirnames if not (
+                self.ignore(d) or self.ignore(os.path.normpath(os.path.join(reldir, d))))]
+            for fn in filenames:
+                relfn = os.path.normpath(os.path.join(reldir, fn))
+                self.files.add(relfn.replace(os.sep, '/'))
+        pages = sorted(fn for fn in self.files if fn.endswith(('.html', '.htm')))
+        paths = [os.path.join(self.sitedir, fn) for fn in pages]
+        if self.jobs > 1 and len(paths) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            chunksize = max(1, len(paths) // (self.jobs * 4))
+            with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+                results = list(pool.map(scan_file, paths, chunksize=chunksize))
+        else:
+            results = [scan_file(p) for p in paths]
+        links = {}
+        for page, (pagelinks, ids) in zip(pages, results):
+            links[page] = pagelinks
+            self.ids[page] = set(ids)
+        return links
+
+    def find(self, relpath, isdir):
+        """Return the site file of a path, or None."""
+        if relpath == '.':
+            relpath = ''
+        candidates = []
+        if not isdir:
+            candidates = [relpath, relpath + self.file_ext]
+        candidates.append(posixpath.join(relpath, 'index' + self.file_ext))
+        for fn in candidates:
+            if fn in self.files:
+                return fn
+        return None
+
+    def check_link(self, page, url):
+        """Return the reason why a link is broken, or None."""
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme or parts.netloc:
+            return None
+        path = urllib.parse.unquote(parts.path)
+        if not path:
+            target = page
+        else:
+            if path.startswith('/'):
+                if self.prefix:
+                    if path != self.prefix and not path.startswith(self.prefix + '/'):
+                        return "outside baseurl"
+                    path = path[len(self.prefix):] or '/'
+                relpath = path.lstrip('/')
+            else:
+                relpath = posixpath.join(posixpath.dirname(page), path)
+            relpath = posixpath.normpath(relpath) if relpath else '.'
+            if relpath == '..' or relpath.startswith('../'):
+                return "outside site"
+            target = self.find(relpath, path.endswith('/'))
+            if target is None:
+                return "missing target"
+        fragment = urllib.parse.unquote(parts.fragment)
+        if fragment and target in self.ids and fragment not in self.ids[target]:
+            return "missing anchor"
+        return None
+
+    def check(self):
+        """Return the broken links as (page, line, url, reason) tuples."""
+        links = self.scan()
+        broken = []
+        for page in sorted(links):
+            for line, url in links[page]:
+                reason = self.check_link(page, url)
+                if reason is not None:
+                    broken.append((page, line, url, reason))
+        return broken
@@ -18,14 +18,15 @@
 import argparse
 
 import os
+import functools
+import threading
+import sys
 from sys import stderr
 
 from urubu import __version__
 from urubu import project
-
-import socketserver
-import http.server as httpserver
-from urubu.httphandler import AliasingHTTPRequestHandler
+from urubu.config import profilefn
+from urubu.watch import Watcher
 
 __IDESC__ = """
 Micro CMS tool to build and test static websites.
@@ -36,14 +37,17 @@ Documentation: <https://urubu.jandecaluwe.com/manual/>
 """
 
 def serve(baseurl, host='localhost', port=8000):
-    """HTTP server straight from the docs."""
+    """Threaded HTTP server, with a thread per connection."""
+    # only loaded for serving
+    import http.server as httpserver
+    from urubu.httphandler import AliasingHTTPRequestHandler
     # allow running this from the top level
+    directory = os.getcwd()
     if os.path.isdir('_build'):
-        os.chdir('_build')
+        directory = os.path.abspath('_build')
+    handler = functools.partial(AliasingHTTPRequestHandler, directory=directory)
     # local use, address reuse should be OK
-    socketserver.TCPServer.allow_reuse_address = True
-    handler = AliasingHTTPRequestHandler
-    httpd = socketserver.TCPServer((host, port), handler)
+    httpd = httpserver.ThreadingHTTPServer((host, port), handler)
     httpd.baseurl = baseurl
 
     if host == '':
@@ -61,13 +65,39 @@ def main():
                                      epilog=__IEPILOG__, description=__IDESC__)
     parser.add_argument('-h', '--help', action='help', help="show program's help and exit")
     parser.add_argument('-v', '--version', action='version', version=__version__)
-    parser.add_argument('command', choices=['build', 'serve', 'serveany'])
+    parser.add_argument('command', choices=['build', 'serve', 'serveany', 'watch',
+                                            'check-links'])
+    parser.add_argument('--clean', action='store_true',
+                        help="build from scratch, without the previous build and caches")
+    parser.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                        help="number of worker processes used to build")
+    parser.add_argument('--watch', action='store_true',
+                        help="rebuild the site on changes while serving")
+    parser.add_argument('--profile', action='store_true',
+                        help="report the time and memory use of the build")
+    parser.add_argument('--stream', action='store_true',
+                        help="build with memory use bounded by the page size")
     args = parser.parse_args()
     if args.command == 'build':
-        project.build()
-    elif args.command == 'serve':
-        proj = project.load()
-        serve(proj.site['baseurl'])
-    elif args.command == 'serveany':
+        proj = project.build(clean=args.clean, jobs=args.jobs, profile=args.profile,
+                             stream=args.stream)
+        if args.profile:
+            print(proj.profiler.get_summary())
+            print("Profile written to {}".format(profilefn))
+    elif args.command == 'check-links':
+        broken, npages = project.check_links(jobs=args.jobs)
+        for page, line, url, reason in broken:
+            print("{}:{}: broken link {} ({})".format(page, line, url, reason))
+        print("{} broken link(s) in {} page(s)".format(len(broken), npages))
+        if broken:
+            sys.exit(1)
+    elif args.command == 'watch':
+        Watcher(jobs=args.jobs).run()
+    elif args.command in ('serve', 'serveany'):
         proj = project.load()
-        serve(proj.site['baseurl'], host='')
+        if args.watch:
+            watcher = Watcher(jobs=args.jobs)
+            watcher.start()
+            threading.Thread(target=watcher.loop, daemon=True).start()
+        host = '' if args.command == 'serveany' else 'localhost'
+        serve(proj.site['baseurl'], host=host)
@@ -0,0 +1,227 @@
+# Copyright 2026 Jan Decaluwe
+#
+# This file is part of Urubu.
+#
+# Urubu is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Urubu is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Urubu.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import json
+import hashlib
+
+from urubu import __version__
+from urubu.config import siteinfofn, layoutdir
+
+# bump when the layout of the manifest changes
+manifest_version = 2
+
+
+def hash_data(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def hash_file(fn):
+    with open(fn, 'rb') as f:
+        return hash_data(f.read())
+
+
+def hash_tree(path):
+    """Return a hash of all files in a directory tree."""
+    h = hashlib.sha1()
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames[:] = sorted(d for d in dirnames if d != '__pycache__')
+        for fn in sorted(filenames):
+            p = os.path.join(dirpath, fn)
+            h.update(os.path.relpath(p, path).encode('utf-8'))
+            h.update(hash_file(p).encode('ascii'))
+    return h.hexdigest()
+
+
+def hash_hooks():
+    """Return a hash of the python hooks, as a package or as a module."""
+    h = hashlib.sha1()
+    h.update(hash_tree('_python').encode('ascii'))
+    if os.path.isfile('_python.py'):
+        h.update(hash_file('_python.py').encode('ascii'))
+    return h.hexdigest()
+
+
+def hash_info(info):
+    """Return a hash of a fileinfo dict, as produced by content discovery.
+
+    The modification date is left out, as it is tracked per page.
+    """
+    data = json.dumps(dict((key, value) for key, value in info.items() if key != 'mdate'),
+                      sort_keys=True, default=str)
+    return hash_data(data.encode('utf-8'))
+
+
+class Manifest(object):
+
+    """Persistent record of the inputs and outputs of a build.
+
+    The manifest stores the hash of the global build inputs, the content
+    hash of each source file with the result of its conversion, the
+    modification date of each page, and the search text of each rendered
+    page with the modification time and size of its output. A later build
+    with the same global inputs can then reuse the results for unchanged
+    source files and outputs. A streaming build keeps neither the
+    converted content nor the text.
+    """
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.state = None
+        self.incremental = False
+        self.hashes = {}
+        self.pages = {}
+        self.outputs = {}
+        self.compressed = {}
+        self.mdates = {}
+        self.mdates_changed = False
+        self._prev = {'state': None, 'pages': {}, 'outputs': {}, 'compressed': {},
+                      'mdates': {}}
+
+    def load(self):
+        """Load the manifest of the previous build, if any."""
+        try:
+            with open(self.fn, encoding='utf-8') as f:
+                prev = json.load(f)
+        except (OSError, ValueError):
+            return
+        if prev.get('version') != manifest_version:
+            return
+        self._prev = prev
+
+    def set_state(self, state):
+        """Set the global build state.
+
+        Incremental building is only possible when the global state
+        matches the state of the previous build.
+        """
+        self.state = state
+        self.incremental = (state == self._prev['state'])
+
+    def set_mdates(self, mdates):
+        """Set the modification dates of the pages, keyed by page id.
+
+        The modification date of a page is an input of that page only.
+        Whether any date has changed is recorded, for the pages that
+        may read the dates of other pages.
+        """
+        self.mdates = mdates
+        self.mdates_changed = (mdates != self._prev['mdates'])
+
+    def mdate_changed(self, id):
+        """Return True if the modification date of a page has changed."""
+        return self.mdates.get(id) != self._prev['mdates'].get(id)
+
+    def get_outputs(self):
+        """Return the page outputs of the previous build."""
+        return set(self._prev['outputs'])
+
+    def lookup_page(self, fn, src):
+        """Return the previous conversion record of an unchanged source.
+
+        The source is the body of the file. Its metadata is covered
+        by the global state.
+        """
+        h = self.hashes[fn] = hash_data(src.encode('utf-8'))
+        if not self.incremental:
+            return None
+        record = self._prev['pages'].get(fn)
+        # records of a streaming build don't keep the content
+        if record is None or record['hash'] != h or 'body' not in record:
+            return None
+        return record
+
+    def lookup_result(self, fn):
+        """Return the hash of the previous conversion result of a file."""
+        if not self.incremental:
+            return None
+        record = self._prev['pages'].get(fn)
+        if record is None:
+            return None
+        return record.get('result')
+
+    def keep_pages(self):
+        """Keep the conversion records of the previous build."""
+        self.pages.update(self._prev['pages'])
+
+    def add_page(self, fn, record):
+        record['hash'] = self.hashes[fn]
+        self.pages[fn] = record
+
+    def lookup_output(self, outfn):
+        """Return the previous record of a rendered page."""
+        if not self.incremental:
+            return None
+        return self._prev['outputs'].get(outfn)
+
+    def add_output(self, outfn, record):
+        self.outputs[outfn] = record
+
+    def get_compressed(self):
+        """Return the source hashes of the compressed files of the previous build.
+
+        Compressed files only depend on their source, so they are
+        kept regardless of the global state.
+        """
+        return self._prev.get('compressed', {})
+
+    def set_compressed(self, records):
+        self.compressed = records
+
+    def save(self):
+        manifest = {'version': manifest_version,
+                    'state': self.state,
+                    'pages': self.pages,
+                    'outputs': self.outputs,
+                    'compressed': self.compressed,
+                    'mdates': self.mdates}
+        tmpfn = self.fn + '.tmp'
+        with open(tmpfn, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmpfn, self.fn)
+        # start over from the saved manifest for a next build
+        self._prev = manifest
+        self.incremental = True
+        self.mdates_changed = False
+        self.hashes = {}
+        self.pages = {}
+        self.outputs = {}
+        self.compressed = {}
+
+
+def get_state(project):
+    """Return the global build state of a project.
+
+    The global state covers everything that can affect any page: the
+    tool versions, the site info, the python hooks, the layouts, the
+    discovered metadata of all content files, and the modification dates
+    that the order of content depends on. Other modification dates are
+    tracked per page.
+    """
+    # the processing libraries are only loaded when needed
+    import markdown, jinja2, pygments
+    state = {}
+    state['versions'] = [__version__, markdown.__version__,
+                         jinja2.__version__, pygments.__version__]
+    state['site'] = hash_file(siteinfofn) if os.path.isfile(siteinfofn) else None
+    state['python'] = hash_hooks()
+    state['layouts'] = hash_tree(layoutdir)
+    state['content'] = project.contenthash
+    mdates = project.get_order_mdates()
+    state['mdates'] = hash_data(json.dumps(mdates, sort_keys=True).encode('utf-8'))
+    state['sitedir'] = project.sitedir
+    return state
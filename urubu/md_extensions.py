@@ -17,6 +17,7 @@
 
 import posixpath
 import re
+import functools
 
 import markdown
 import logging
@@ -24,13 +25,19 @@ logging.captureWarnings(False)
 
 from markdown import Extension
 from markdown.extensions import toc 
+from markdown.extensions import codehilite, fenced_code
 from markdown.treeprocessors import Treeprocessor
 from markdown.inlinepatterns import ReferenceInlineProcessor, REFERENCE_RE
 from markdown.inlinepatterns import AsteriskProcessor, EmStrongItem 
 from markdown.inlinepatterns import EM_STRONG2_RE, STRONG_EM2_RE
 from markdown.inlinepatterns import SMART_STRONG_EM_RE, SMART_STRONG_RE, SMART_EMPHASIS_RE
 
+import pygments
+import pygments.lexers
+from pygments.util import ClassNotFound
+
 from urubu import UrubuWarning, urubu_warn, UrubuError, _warning, _error
+from urubu.cache import make_key
 
 
 def _set_dl_class(tree):
@@ -77,6 +84,13 @@ class TableClassExtension(Extension):
         md.treeprocessors.register(TableClass(md), 'tableclass', 4)
 
 
+def get_reflink_value(item):
+    """Return the part of a reflink that is used in a conversion."""
+    if item is None:
+        return None
+    return [item.get('url'), item.get('title')]
+
+
 class ProjectReferenceInlineProcessor(ReferenceInlineProcessor):
 
     def handleMatch(self, m, data):
@@ -111,12 +125,12 @@ class ProjectReferenceInlineProcessor(ReferenceInlineProcessor):
             else:
                 id = ref.lower()
             ref = ref.lower()
-            if ref in self.md.site['reflinks']:
-                if (ref != id) and (id in self.md.site['reflinks']):
+            if self.get_reflink(ref) is not None:
+                if (ref != id) and (self.get_reflink(id) is not None):
                     raise UrubuError(_error.ambig_ref_md, msg=ref, fn=this['fn'])
                 id = ref
-            if id in self.md.site['reflinks']:
-                item = self.md.site['reflinks'][id]
+            item = self.get_reflink(id)
+            if item is not None:
                 href, title = item['url'], item['title']
                 if shortref:
                     text = title
@@ -134,6 +148,14 @@ class ProjectReferenceInlineProcessor(ReferenceInlineProcessor):
 
         return self.makeTag(href, title, text), m.start(0), end
 
+    def get_reflink(self, id):
+        """Return a site reflink, and record its use if requested."""
+        item = self.md.site['reflinks'].get(id)
+        used = getattr(self.md, 'reflinks_used', None)
+        if used is not None:
+            used[id] = get_reflink_value(item)
+        return item
+
     def evalRef(self, data, index, text):
         """
         Evaluate ref from [text][ref] or [ref][] 
@@ -213,4 +235,60 @@ class MarkTagExtension(Extension):
         md.inlinePatterns.register(UnderscoreMarkProcessor(r'_'), 'em_strong2', 50)
 
 
+@functools.lru_cache(maxsize=None)
+def find_lexer_class(alias):
+    """Return the lexer class for an alias, or None."""
+    try:
+        return pygments.lexers.find_lexer_class_by_name(alias)
+    except ClassNotFound:
+        return None
+
+
+def get_lexer_by_name(alias, **options):
+    """Like the pygments function, without searching the registry each time."""
+    cls = find_lexer_class(alias)
+    if cls is None:
+        raise ClassNotFound('no lexer for alias {!r} found'.format(alias))
+    return cls(**options)
+
+
+# cache of highlighted code blocks, shared by all markdown instances
+hilite_cache = None
+
+
+class CachedCodeHilite(codehilite.CodeHilite):
+
+    """Code highlighter that caches its results.
+
+    The html only depends on the code and the options, so it is
+    cached by those. The options are taken from the instance state, as
+    their attributes differ between markdown versions.
+    """
+
+    def hilite(self, *args, **kwargs):
+        if hilite_cache is None:
+            return super().hilite(*args, **kwargs)
+        state = sorted((name, sorted(value.items()) if isinstance(value, dict) else value)
+                       for name, value in vars(self).items() if name != 'src')
+        key = make_key(self.src, repr((pygments.__version__, markdown.__version__,
+                                       args, sorted(kwargs.items()), state)))
+        html = hilite_cache.get(key)
+        if html is None:
+            html = super().hilite(*args, **kwargs)
+            hilite_cache.put(key, html)
+        return html
+
+
+def set_hilite_cache(cache):
+    """Cache the highlighting of code blocks, and the lexer lookups.
 
+    The code blocks of codehilite and fenced code are highlighted with
+    module level names, so the cached versions are installed there, once.
+    Without a cache, they highlight as the originals.
+    """
+    global hilite_cache
+    hilite_cache = cache
+    if codehilite.CodeHilite is not CachedCodeHilite:
+        codehilite.CodeHilite = CachedCodeHilite
+        fenced_code.CodeHilite = CachedCodeHilite
+        codehilite.get_lexer_by_name = get_lexer_by_name
@@ -0,0 +1,147 @@
+# Copyright 2026 Jan Decaluwe
+#
+# This file is part of Urubu.
+#
+# Urubu is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Urubu is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Urubu.  If not, see <http://www.gnu.org/licenses/>.
+
+import re
+
+# elements whose content is kept as is; codehilite blocks are in a pre
+raw_tags = ('pre', 'textarea', 'script', 'style')
+
+# html whitespace, unlike \s without non-breaking spaces
+space_re = re.compile(r'([ \t\n\r\f]+)')
+tag_re = re.compile(r'''<[^>"']*(?:(?:"[^"]*"|'[^']*')[^>"']*)*>''')
+tagname_re = re.compile(r'<(/?)([A-Za-z][\w:-]*)')
+raw_end_res = dict((name, re.compile(r'</{}(?=[\s/>])'.format(name), re.IGNORECASE))
+                   for name in raw_tags)
+
+
+class HTMLMinifier(object):
+
+    """Streaming html minifier.
+
+    Html is fed in chunks, and the minified html is returned as far as
+    it can be decided. Comments are dropped, except for conditional
+    comments. Runs of whitespace in text are collapsed to a newline if
+    they contain one, and to a space otherwise. Tags and the content of
+    raw elements such as pre and script are kept as is.
+    """
+
+    def __init__(self):
+        # unprocessed input, and pending whitespace
+        self.buf = ''
+        self.space = ''
+        # the name of the raw element we are in
+        self.raw = None
+
+    def feed(self, data):
+        """Feed a chunk of html, and return the minified html so far."""
+        buf = self.buf + data
+        n = len(buf)
+        # scan by position, and keep the unprocessed rest at the end
+        pos = 0
+        out = []
+        while pos < n:
+            if self.raw is not None:
+                m = raw_end_res[self.raw].search(buf, pos)
+                if m is None:
+                    # keep a possibly partial end tag
+                    end = max(n - len(self.raw) - 2, pos)
+                    self.emit(out, buf[pos:end])
+                    pos = end
+                    break
+                self.emit(out, buf[pos:m.start()])
+                pos = m.start()
+                self.raw = None
+            i = buf.find('<', pos)
+            if i < 0:
+                self.text(out, buf[pos:])
+                pos = n
+                break
+            self.text(out, buf[pos:i])
+            pos = i
+            if buf.startswith('<!--', pos):
+                j = buf.find('-->', pos + 4)
+                if j < 0:
+                    break
+                comment = buf[pos:j+3]
+                pos = j + 3
+                if comment.startswith(('<!--[', '<!--<!')):
+                    # conditional comments are kept
+                    self.emit(out, comment)
+                continue
+            if n - pos < 4 and ('<!--'.startswith(buf[pos:]) or buf[pos:] == '</'):
+                # a possibly partial comment start or end tag
+                break
+            m = tagname_re.match(buf, pos)
+            if m is None and not buf.startswith(('<!', '<?'), pos):
+                # a literal '<' in text
+                self.text(out, '<')
+                pos += 1
+                continue
+            m2 = tag_re.match(buf, pos)
+            if m2 is None:
+                # wait for the end of the tag
+                break
+            self.emit(out, m2.group())
+            pos = m2.end()
+            if m is not None and not m.group(1):
+                name = m.group(2).lower()
+                if name in raw_tags and not m2.group().endswith('/>'):
+                    self.raw = name
+        self.buf = buf[pos:]
+        return ''.join(out)
+
+    def close(self):
+        """Return the rest of the minified html."""
+        out = []
+        if self.buf:
+            if self.raw is None and not self.buf.startswith('<'):
+                self.text(out, self.buf)
+            else:
+                # an unterminated element or comment is kept as is
+                self.emit(out, self.buf)
+        out.append(self.space)
+        self.buf = ''
+        self.space = ''
+        return ''.join(out)
+
+    def emit(self, out, s):
+        if s:
+            out.append(self.space)
+            out.append(s)
+            self.space = ''
+
+    def text(self, out, s):
+        for i, part in enumerate(space_re.split(s)):
+            if not part:
+                continue
+            if i % 2:
+                if '\n' in part or self.space == '\n':
+                    self.space = '\n'
+                else:
+                    self.space = ' '
+            else:
+                self.emit(out, part)
+
+
+def minify_html(chunks):
+    """Generate the minified html of a sequence of html chunks."""
+    minifier = HTMLMinifier()
+    for chunk in chunks:
+        s = minifier.feed(chunk)
+        if s:
+            yield s
+    yield minifier.close()
@@ -15,19 +15,35 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with Urubu.  If not, see <http://www.gnu.org/licenses/>.
 
-import os, sys, json, itertools
+import os, sys, json, time, marshal, textwrap, contextlib, itertools, collections, collections.abc
+import warnings
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 import markdown
+import pygments
 import logging
 logging.captureWarnings(False)
-from bs4 import BeautifulSoup
 
 import jinja2
+from jinja2 import meta, nodes
 
-from urubu import UrubuWarning, UrubuError, urubu_warn, _warning
-from urubu import md_extensions
+from urubu import __version__, UrubuWarning, UrubuError, urubu_warn, _warning, _error
+from urubu import md_extensions, readers
+from urubu.md_extensions import get_reflink_value
+from urubu.profiler import phase
+from urubu.cache import Cache, make_key
+from urubu.manifest import hash_data, hash_file
+from urubu.spill import SpillStore, load_text
+from urubu.search import extract_text, truncate_text, SearchIndex
+from urubu.minify import minify_html
 
-from urubu.config import layoutdir, tag_layout, tipuesearchdir, tipuesearch_content
+from urubu.config import (layoutdir, tag_layout, tipuesearchdir, tipuesearch_content,
+                          searchindexdir, searchindex_prefix_length,
+                          searchindex_text_limit, template_cache_size,
+                          template_cache_disk_size, markdown_cache_size,
+                          markdown_cache_disk_size, highlight_cache_size,
+                          highlight_cache_disk_size)
 
 def skip_yamlfm(f):
     """Return source of a file without yaml frontmatter."""
@@ -42,14 +58,156 @@ def skip_yamlfm(f):
     return ''.join(lines)
 
 
+class PageSlice(collections.abc.Sequence):
+
+    """A slice of a content list that doesn't copy the items."""
+
+    def __init__(self, items, start, stop):
+        self.items = items
+        self.range = range(len(items))[start:stop]
+
+    def __len__(self):
+        return len(self.range)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.items[j] for j in self.range[i]]
+        return self.items[self.range[i]]
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+def dump_json(obj):
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+def get_urubu_warnings(caught):
+    """Return the messages of caught urubu warnings, and reissue the others."""
+    urubu_warnings = []
+    for w in caught:
+        if issubclass(w.category, UrubuWarning):
+            urubu_warnings.append(str(w.message))
+        else:
+            warnings.warn_explicit(w.message, w.category, w.filename, w.lineno)
+    return urubu_warnings
+
+
+# page attributes that are only known after conversion or rendering
+content_keys = ('body', 'toc', 'text')
+
+def uses_shared_content(env, name, filters=(), keys=content_keys, seen=None):
+    """Check whether a template may use content of other pages than 'this'.
+
+    The check is conservative: any access to one of the keys that is
+    not directly on 'this' counts, as well as dynamic template references,
+    and the use of the given filters, which are defined by the project
+    and may read the content of any page they are passed.
+    """
+    if seen is None:
+        seen = set()
+    if name in seen:
+        return False
+    seen.add(name)
+    source = env.loader.get_source(env, name)[0]
+    ast = env.parse(source)
+    for node in ast.find_all(nodes.Filter):
+        if node.name in filters:
+            return True
+    for node in ast.find_all((nodes.Getattr, nodes.Const)):
+        if isinstance(node, nodes.Const):
+            if node.value in keys:
+                return True
+        elif node.attr in keys:
+            if not (isinstance(node.node, nodes.Name) and node.node.name == 'this'):
+                return True
+    for ref in meta.find_referenced_templates(ast):
+        if ref is None or uses_shared_content(env, ref, filters, keys, seen):
+            return True
+    return False
+
+
+def make_pool(jobs, initializer, initargs):
+    """Return a process pool with initialized workers.
+
+    Forked workers inherit the project from the parent, so it doesn't
+    have to be pickled.
+    """
+    context = None
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    return ProcessPoolExecutor(max_workers=jobs, mp_context=context,
+                               initializer=initializer, initargs=initargs)
+
+
+def get_chunksize(n, jobs):
+    return max(1, n // (jobs * 4))
+
+
+# per-process content processor of a worker, and its pages to render
+_worker = None
+_worker_pages = None
+
+def _init_worker(sitedir, project):
+    global _worker, _worker_pages
+    with warnings.catch_warnings():
+        # warnings are reported by the parent process
+        warnings.simplefilter('ignore')
+        _worker = ContentProcessor(sitedir, project)
+    _worker_pages = None
+
+def _convert_worker(i):
+    return _worker.convert_file(_worker.filelist[i])
+
+def _render_worker(i):
+    global _worker_pages
+    if _worker_pages is None:
+        _worker_pages = _worker.get_pages()
+    info = _worker_pages[i]
+    timings = _worker.render_file(info)
+    return info['text'], timings
+
+
+class ContentEnvironment(jinja2.Environment):
+
+    """Jinja environment that loads spilled text when it is looked up.
+
+    In streaming mode, converted content is kept as lazy proxies. Loading
+    them on attribute and item lookup gives templates plain strings, as
+    in a normal build.
+    """
+
+    def getattr(self, obj, attribute):
+        return load_text(super().getattr(obj, attribute))
+
+    def getitem(self, obj, argument):
+        return load_text(super().getitem(obj, argument))
+
+
 class ContentProcessor(object):
 
-    def __init__(self, sitedir, project):
+    def __init__(self, sitedir, project, manifest=None, jobs=1, stream=False):
         self.sitedir = sitedir
         self.filelist = project.filelist
         self.navlist = project.navlist
         self.taglist = project.taglist
         self.site = project.site
+        self.anchors = project.anchors
+        self.sources = project.sources
+        # with a manifest, results of the previous build are reused
+        self.manifest = manifest
+        self.converted = set()
+        self.shared_layouts = None
+        self.mdate_layouts = None
+        # with more than one job, work is spread over a process pool
+        self.project = project
+        self.jobs = jobs
+        # in streaming mode, content is kept in a spill store
+        self.stream = stream
+        self.store = None
+        self.profiler = project.profiler
+        self.search = self.has_search()
+        self.minify = bool(self.site.get('minify_html'))
         dlclass = md_extensions.DLClassExtension()
         tableclass = md_extensions.TableClassExtension()
         projectref = md_extensions.ProjectReferenceExtension()
@@ -69,19 +227,56 @@ class ContentProcessor(object):
         self.md = markdown.Markdown(extensions=extensions,
                                     extension_configs=extension_configs)
         self.md.site = self.site
-        self.md.anchors = project.anchors
+        self.md.anchors = self.anchors
         if 'strict_undefined' in self.site and self.site['strict_undefined']:
             undefined_class = jinja2.StrictUndefined
         else:
             undefined_class = jinja2.Undefined
-        env = self.env = jinja2.Environment(
+        env = self.env = ContentEnvironment(
             loader=jinja2.FileSystemLoader(layoutdir),
             lstrip_blocks=True,
             trim_blocks=True,
             undefined=undefined_class)
         env.filters.update(project.filters)
+        # markers of template syntax in page sources
+        self.template_markers = (env.block_start_string,
+                                 env.variable_start_string,
+                                 env.comment_start_string)
+        # compiled in-page templates, keyed by a hash of their source
+        path = None
+        if project.cachedir is not None:
+            path = os.path.join(project.cachedir, 'templates')
+        self.template_cache = Cache(path, template_cache_size,
+                                    template_cache_disk_size,
+                                    marshal.dumps, marshal.loads)
+        path = None
+        if project.cachedir is not None:
+            path = os.path.join(project.cachedir, 'markdown')
+        self.conversion_cache = Cache(path, markdown_cache_size,
+                                      markdown_cache_disk_size,
+                                      dump_json, json.loads)
+        # highlighted code blocks, shared by the pages
+        path = None
+        if project.cachedir is not None:
+            path = os.path.join(project.cachedir, 'highlight')
+        md_extensions.set_hilite_cache(Cache(path, highlight_cache_size,
+                                             highlight_cache_disk_size,
+                                             str.encode, bytes.decode))
+        self.conversion_key = repr((__version__, markdown.__version__,
+                                    pygments.__version__,
+                                    [e if isinstance(e, str) else type(e).__name__
+                                     for e in extensions],
+                                    extension_configs,
+                                    hash_file(md_extensions.__file__)))
+        self.template_key = repr((jinja2.__version__, sys.version,
+                                  env.lstrip_blocks, env.trim_blocks,
+                                  env.newline_sequence, sorted(env.filters),
+                                  sorted(env.tests)) + self.template_markers)
+        self.load_templates(project.layouts)
+
+    def load_templates(self, layouts):
         self.templates = {}
-        for layout in project.layouts:
+        for layout in layouts:
             self.templates[layout] = self.env.get_template(layout + '.html')
         # layout for tags is optional, triggers index file generation per tag
         try:
@@ -91,17 +286,60 @@ class ContentProcessor(object):
             if self.taglist:
                 urubu_warn(_warning.undef_tag_layout, msg=tag_layout)
 
+    def update(self, project, manifest=None, jobs=1, stream=False):
+        """Prepare for a new build of the project.
+
+        The markdown instance and the jinja environment are kept, so that
+        a long-lived processor doesn't have to set them up again. Changed
+        layouts are reloaded by the environment.
+        """
+        self.filelist = project.filelist
+        self.navlist = project.navlist
+        self.taglist = project.taglist
+        self.anchors = project.anchors
+        self.sources = project.sources
+        self.manifest = manifest
+        self.converted = set()
+        self.shared_layouts = None
+        self.mdate_layouts = None
+        self.project = project
+        self.jobs = jobs
+        self.stream = stream
+        self.profiler = project.profiler
+        self.search = self.has_search()
+        self.minify = bool(self.site.get('minify_html'))
+        self.md.anchors = self.anchors
+        self.load_templates(project.layouts)
+
+    def has_search(self):
+        """Return True if search content is generated for the site."""
+        if self.site.get('search_index'):
+            return True
+        return os.path.isdir(os.path.join(self.sitedir, tipuesearchdir))
+
     def process(self):
         """Process the content.
 
         Conversion and rendering are done in separate phases, so
         that the full content is available to the rendering process.
+        In streaming mode, the converted content and the search text
+        are spilled to a temporary store, and loaded when needed. The
+        converted content is kept in memory when the project defines
+        filters.
         """
-        self.convert()
-        self.alt_layouts()
-        self.pagination()
-        self.render()
-        self.make_tipuesearch_content()
+        if self.store is not None:
+            self.store.close()
+        self.store = SpillStore() if self.stream else None
+        with phase(self.profiler, 'convert'):
+            self.convert()
+        with phase(self.profiler, 'alt_layouts'):
+            self.alt_layouts()
+        with phase(self.profiler, 'pagination'):
+            self.pagination()
+        with phase(self.profiler, 'render'):
+            self.render()
+        with phase(self.profiler, 'search'):
+            self.make_search_content()
 
     def alt_layouts(self):
         # If a file contains the alt_layouts attribute, then
@@ -114,8 +352,7 @@ class ContentProcessor(object):
                     new_info = info.copy()
                     
                     # Make sure the alt layout is available
-                    if layout['layout'] not in self.templates:
-                        self.templates[layout['layout']] = self.env.get_template(layout['layout'] + '.html')
+                    self.get_template(layout['layout'])
                         
                     # Set the layout of the new file
                     new_info['layout'] = layout['layout']
@@ -161,65 +398,81 @@ class ContentProcessor(object):
         # will have no nextpage.
 
         import math
-        
+
+        # index of the file list by filename, for items_index lookups
+        fninfo = {}
+        for info in self.filelist:
+            fninfo.setdefault(info['fn'], info)
+        # results of items_filter expressions
+        filtered = {}
+        new_pages = []
+
         for info in self.filelist:
             source = None
-            
+
             if 'items_per_page' in info:
                 if 'items_index' in info:
                     if info['items_index'] == "this":
                         source = info['content']
                     else:
-                        source = next(x for x in self.filelist if x['fn'] == info['items_index'])['content']
-            
+                        if info['items_index'] not in fninfo:
+                            raise UrubuError(_error.undef_ref, msg=info['items_index'],
+                                             fn=info['fn'])
+                        source = fninfo[info['items_index']]['content']
+
                 if 'items_filter' in info:
-                    filter = info['items_filter'].split()
-                    source = self.env.filters[filter[0]](*filter[1:])
-                
+                    expr = info['items_filter']
+                    if expr not in filtered:
+                        filter = expr.split()
+                        filtered[expr] = self.env.filters[filter[0]](*filter[1:])
+                    source = filtered[expr]
+
                 if source:
                     items_per_page = info['items_per_page']
-                    
+
                     # This will be a shared list among all the pages
                     # that lists each page along with its page number,
                     # e.g. {'pagenum': 1, 'page': info}
                     pages = []
-                    
+
                     # Split source into items_per_page sized chunks,
                     # starting with info and then creating new
-                    # files with incrementing numbers
-                    
+                    # files with incrementing numbers.  Chunks are
+                    # views on the source, sliced when they are used.
+
                     chunks = math.ceil(len(source) / items_per_page)
 
                     # First chunk is always the current page
-                    info['content'] = source[0:items_per_page]
-                    
+                    info['content'] = PageSlice(source, 0, items_per_page)
+
                     # See if we even need to worry about pagination
                     # Maybe everything fits on the one page already
                     if len(source) <= items_per_page:
                         continue
-                    
+
                     info['numpages'] = chunks
                     info['thispage'] = 1
                     info['pages'] = pages
-                    
+
                     pages.append({'pagenum': 1, 'page': info})
-                    
+
                     chunk = 1
                     prev_page = info
-                    
+
                     # If we need more chunks, split off new pages for them
                     while chunk < chunks:
                         chunk += 1
                         new_info = info.copy()
                         # Prevent the new page from spinning off new pages
                         del new_info['items_per_page']
-                        
+
                         new_info['pages'] = pages
                         pages.append({'pagenum': chunk, 'page': new_info})
-                        
+
                         # Set the content to the right slice of the source
-                        new_info['content'] = source[(chunk-1)*items_per_page:(chunk-1)*items_per_page+items_per_page]
-                        
+                        start = (chunk-1)*items_per_page
+                        new_info['content'] = PageSlice(source, start, start+items_per_page)
+
                         new_info['numpages'] = chunks
                         new_info['thispage'] = chunk
 
@@ -229,44 +482,64 @@ class ContentProcessor(object):
 
                         fn_parts = os.path.splitext(new_info['url'])
                         new_info['url'] = fn_parts[0]+str(chunk)+fn_parts[1]
-                        
+
                         # Setup the prevpage and nextpage attributes
                         new_info['prevpage'] = prev_page
                         prev_page['nextpage'] = new_info
                         # We may have inherited this from the first chunk
                         if 'nextpage' in new_info:
                             del new_info['nextpage']
-                        
+
                         prev_page = new_info
-                        
-                        self.filelist.append(new_info)
-        
+
+                        fninfo.setdefault(new_info['fn'], new_info)
+                        new_pages.append(new_info)
+
+        # new pages come after the existing ones, and are not paginated
+        self.filelist.extend(new_pages)
+
     def convert(self):
-        for info in self.filelist:
-            fn = info['fn']
-            with open(fn, encoding='utf-8-sig') as inf:
-                src = skip_yamlfm(inf)
-            self.md.this = info
-            # first process as a template
-            try:
-                templ = self.env.from_string(src)
-                src = templ.render(this=info, site=self.site)
-            except:
-                exc, msg, tb = sys.exc_info()
-                raise UrubuError(str(exc), msg=msg, fn=fn)
-            self.md.toc = ''
-            info['body'] = self.md.convert(src)
-            info['toc'] = ''
-            if hasattr(self.md, 'toc'):
-                # filter out empty tocs, 35 is the magic length
-                if len(self.md.toc) > 35:
-                    info['toc'] = self.md.toc
-            # markdown support in keys
-            mdkeys = [key for key in info if key[-3:] == '.md']
-            for mdkey in mdkeys:
-                key = mdkey[:-3]
-                info[key] = self.md.convert(info[mdkey])
-            self.md.reset()
+        records = []
+        todo = []
+        for i, info in enumerate(self.filelist):
+            record = None
+            if self.manifest is not None:
+                src = self.get_source(info)
+                record = self.manifest.lookup_page(info['fn'], src)
+                # the template pre-pass may read modification dates
+                if self.manifest.mdates_changed and self.is_template(src):
+                    record = None
+            if record is None:
+                todo.append(i)
+            records.append(record)
+        pool = contextlib.nullcontext()
+        if self.jobs > 1 and len(todo) > 1:
+            pool = make_pool(self.jobs, _init_worker, (self.sitedir, self.project))
+            chunksize = get_chunksize(len(todo), self.jobs)
+            results = pool.map(_convert_worker, todo, chunksize=chunksize)
+        else:
+            results = (self.convert_file(self.filelist[i]) for i in todo)
+        # merge the results in file order, as in a serial build
+        with pool:
+            for info, record in zip(self.filelist, records):
+                if record is None:
+                    record = next(results)
+                    # pages with the same conversion as before don't
+                    # have to be rendered again
+                    if self.manifest is None or \
+                       self.manifest.lookup_result(info['fn']) != record['result']:
+                        self.converted.add(info['id'])
+                self.apply_record(info, record)
+                if self.manifest is not None:
+                    self.manifest.add_page(info['fn'], self.get_page_record(record))
+        # source bodies are no longer needed
+        for fn, (pos, body) in self.sources.items():
+            self.sources[fn] = (pos, None)
+        # markdown keys of folders are converted in the context of the
+        # last content file, as in a full build
+        if self.filelist:
+            self.md.this = self.filelist[-1]
+        self.md.anchors = self.navanchors = set()
         for info in self.navlist:
             # markdown support in keys
             mdkeys = [key for key in info if key[-3:] == '.md']
@@ -274,71 +547,414 @@ class ContentProcessor(object):
                 key = mdkey[:-3]
                 info[key] = self.md.convert(info[mdkey])
             self.md.reset()
+        self.anchors.update(self.navanchors)
+
+    def update_content(self, fns):
+        """Process changed content files again, after a full build.
+
+        Only the metadata of the files is assumed to be unchanged.
+        The files are converted again, and the pages that depend on
+        their content are rendered again.
+        """
+        self.converted = set()
+        self.manifest.keep_pages()
+        changed = {}
+        for info in self.filelist:
+            # copies for alt layouts and pagination come after the original
+            if info['fn'] in fns and info['fn'] not in changed:
+                changed[info['fn']] = info
+        for fn, info in changed.items():
+            record = self.manifest.lookup_page(fn, self.get_source(info))
+            info['_anchorrefs'].clear()
+            if record is None:
+                record = self.convert_file(info)
+                self.converted.add(info['id'])
+            self.apply_record(info, record)
+            self.manifest.add_page(fn, self.get_page_record(record))
+            for other in self.filelist:
+                if other['id'] == info['id'] and other is not info:
+                    other['body'] = info['body']
+                    other['toc'] = info['toc']
+                    for key in record['mdkeys']:
+                        other[key] = info[key]
+        for fn, (pos, body) in self.sources.items():
+            self.sources[fn] = (pos, None)
+        # anchors of changed pages may have gone
+        self.anchors.clear()
+        for record in self.manifest.pages.values():
+            self.anchors.update(record['anchors'])
+        self.anchors.update(self.navanchors)
+        self.render()
+        self.make_search_content()
+
+    def get_source(self, info):
+        """Return the source of a content file, without yaml frontmatter.
+
+        The source is taken from discovery when possible, so that the
+        file doesn't have to be scanned again.
+        """
+        fn = info['fn']
+        pos, body = self.sources.get(fn, (None, None))
+        if body is not None:
+            return body
+        if pos is not None:
+            return readers.read_body(fn, pos)
+        with open(fn, encoding='utf-8-sig') as inf:
+            return skip_yamlfm(inf)
+
+    def convert_file(self, info):
+        """Convert a content file and return the conversion record."""
+        fn = info['fn']
+        src = self.get_source(info)
+        start = time.perf_counter()
+        with warnings.catch_warnings(record=True) as caught:
+            # first process as a template
+            try:
+                src = self.render_source(src, info)
+            except:
+                exc, msg, tb = sys.exc_info()
+                raise UrubuError(str(exc), msg=msg, fn=fn)
+            jinja_done = time.perf_counter()
+            njinja = len(caught)
+            key = self.get_conversion_key(src, info)
+            record = self.lookup_conversion(key)
+            if record is None:
+                record = self.convert_source(src, info)
+                converted = caught[njinja:]
+                del caught[njinja:]
+                record['warnings'] = get_urubu_warnings(converted)
+                self.store_conversion(key, record)
+            del record['reflinks']
+        timings = {'jinja': jinja_done - start,
+                   'markdown': time.perf_counter() - jinja_done}
+        # warnings of the pre-pass come first, as in a serial build
+        record['warnings'] = get_urubu_warnings(caught) + record['warnings']
+        record['timings'] = timings
+        return record
+
+    def convert_source(self, src, info):
+        """Convert the markdown of a content file.
+
+        The reflinks that are looked up while converting are recorded
+        with the record.
+        """
+        self.md.this = info
+        self.md.anchors = set()
+        self.md.reflinks_used = {}
+        self.md.toc = ''
+        body = self.md.convert(src)
+        toc = ''
+        if hasattr(self.md, 'toc'):
+            # filter out empty tocs, 35 is the magic length
+            if len(self.md.toc) > 35:
+                toc = self.md.toc
+        # markdown support in keys
+        mdkeys = {}
+        for mdkey in [key for key in info if key[-3:] == '.md']:
+            mdkeys[mdkey[:-3]] = self.md.convert(info[mdkey])
+        self.md.reset()
+        reflinks_used = self.md.reflinks_used
+        self.md.reflinks_used = None
+        result = hash_data(json.dumps([body, toc, mdkeys], sort_keys=True).encode('utf-8'))
+        return {'body': body,
+                'toc': toc,
+                'mdkeys': mdkeys,
+                'result': result,
+                'anchors': sorted(self.md.anchors),
+                'anchorrefs': sorted(info['_anchorrefs']),
+                'reflinks': reflinks_used}
+
+    def get_conversion_key(self, src, info):
+        """Return the key of a conversion in the conversion cache.
+
+        Besides the source, a conversion depends on the position of the
+        file in the project, on its markdown keys and on the reflinks
+        it uses. The reflinks are checked when the conversion is reused.
+        """
+        mdsrc = dict((key, info[key]) for key in info if key[-3:] == '.md')
+        return make_key(self.conversion_key, info['fn'], info['id'],
+                        '/'.join(info['components']),
+                        json.dumps(mdsrc, sort_keys=True, default=str), src)
+
+    def lookup_conversion(self, key):
+        record = self.conversion_cache.get(key)
+        if record is None:
+            return None
+        reflinks = self.site['reflinks']
+        for id, used in record['reflinks'].items():
+            if get_reflink_value(reflinks.get(id)) != used:
+                return None
+        return dict(record)
+
+    def store_conversion(self, key, record):
+        self.conversion_cache.put(key, dict(record))
+
+    def is_template(self, src):
+        """Return True if a source contains template syntax."""
+        return any(marker in src for marker in self.template_markers)
+
+    def render_source(self, src, info):
+        """Render the source of a content file as a template."""
+        if not self.is_template(src):
+            # the result of rendering text without template syntax
+            if '\r' in src:
+                src = src.replace('\r\n', '\n').replace('\r', '\n')
+            if src.endswith('\n'):
+                src = src[:-1]
+            return src
+        return self.get_page_template(src).render(this=info, site=self.site)
+
+    def get_page_template(self, src):
+        """Return the compiled template of a source, from the cache if possible."""
+        env = self.env
+        key = make_key(self.template_key, src)
+        code = self.template_cache.get(key)
+        if code is None:
+            code = env.compile(src)
+            self.template_cache.put(key, code)
+        return env.template_class.from_code(env, code, env.make_globals(None))
+
+    def apply_record(self, info, record):
+        """Add the results of a conversion to a fileinfo dict."""
+        # timings are only known for new conversions, and not kept
+        timings = record.pop('timings', None)
+        if timings is not None:
+            self.add_timings(info, timings)
+        info['body'] = self.keep_content(record['body'])
+        info['toc'] = self.keep_content(record['toc'])
+        for key, value in record['mdkeys'].items():
+            info[key] = self.keep_content(value)
+        info['_anchorrefs'].update(record['anchorrefs'])
+        self.anchors.update(record['anchors'])
+        for msg in record['warnings']:
+            warnings.warn(msg, UrubuWarning, stacklevel=2)
+
+    def keep_text(self, text):
+        """Return a text to keep with the content, spilled in streaming mode."""
+        if self.store is None or text is None:
+            return text
+        return self.store.put(text)
+
+    def keep_content(self, text):
+        """Return converted content to keep with a page.
+
+        Project filters may read the content of any page they are
+        passed, and get plain strings. With project filters, converted
+        content is therefore not spilled.
+        """
+        if self.project.filters:
+            return text
+        return self.keep_text(text)
+
+    def get_page_record(self, record):
+        """Return the conversion record to keep in the manifest.
+
+        In streaming mode, the converted content is not kept. The
+        conversions are then redone, from the conversion cache.
+        """
+        if not self.stream:
+            return record
+        return dict((key, value) for key, value in record.items()
+                    if key not in ('body', 'toc', 'mdkeys'))
 
     def render(self):
+        pages = self.get_pages()
+        outfns = [self.get_outfn(info) for info in pages]
+        records = []
+        todo = []
+        for info, outfn in zip(pages, outfns):
+            record = self.lookup_output(info, outfn)
+            if record is None:
+                todo.append(len(records))
+            records.append(record)
+        if self.jobs > 1 and len(todo) > 1:
+            # pages that share an output file are rendered in order afterwards
+            counts = collections.Counter(outfns[i] for i in todo)
+            shared = [i for i in todo if counts[outfns[i]] > 1]
+            todo = [i for i in todo if counts[outfns[i]] == 1]
+            if self.store is not None:
+                # make the spilled content visible to the workers
+                self.store.flush()
+            with make_pool(self.jobs, _init_worker, (self.sitedir, self.project)) as pool:
+                chunksize = get_chunksize(len(todo), self.jobs)
+                results = pool.map(_render_worker, todo, chunksize=chunksize)
+                for i, (text, timings) in zip(todo, results):
+                    records[i] = {'text': self.keep_text(text)}
+                    self.add_timings(pages[i], timings)
+            todo = shared
+        for i in todo:
+            timings = self.render_file(pages[i])
+            records[i] = {'text': self.keep_text(pages[i]['text'])}
+            self.add_timings(pages[i], timings)
+        for info, outfn, record in zip(pages, outfns, records):
+            info['text'] = record['text']
+            if self.manifest is not None:
+                relfn = os.path.relpath(outfn, self.sitedir)
+                # the output is checked before it is reused
+                st = os.stat(outfn)
+                output = {'stat': [st.st_mtime_ns, st.st_size]}
+                # in streaming mode, the text is not kept
+                if not self.stream:
+                    output['text'] = record['text']
+                self.manifest.add_output(relfn, output)
+
+    def get_pages(self):
+        """Return the pages to render, in order."""
         # content files
-        for info in self.filelist:
-            if info['layout'] is None:
-                continue
-            self.render_file(info)
+        pages = [info for info in self.filelist if info['layout'] is not None]
         # tag index files
-        if tag_layout not in self.templates:
-            return
-        for info in self.taglist:
-            self.render_file(info)
+        if tag_layout in self.templates:
+            pages.extend(self.taglist)
+        return pages
+
+    def get_template(self, layout):
+        if layout not in self.templates:
+            self.templates[layout] = self.env.get_template(layout + '.html')
+        return self.templates[layout]
+
+    def add_timings(self, info, timings):
+        if self.profiler is not None:
+            self.profiler.add_timings(info['id'], timings)
 
     def render_file(self, info):
-        layout = info['layout']
-        templ = self.templates[layout]
-        html = templ.render(this=info, site=self.site)
+        """Render a page and write it. Return the timings of the steps."""
+        start = time.perf_counter()
+        templ = self.get_template(info['layout'])
+        if self.minify:
+            # minify the html while it is generated
+            html = ''.join(minify_html(templ.generate(this=info, site=self.site)))
+        else:
+            html = templ.render(this=info, site=self.site)
+        render_done = time.perf_counter()
         # extract text from html for search support
         self.extract_text(html, info)
-        fn = info['fn']
+        text_done = time.perf_counter()
+        outfn = self.get_outfn(info)
+        with open(outfn, 'w', encoding='utf-8', errors='strict') as outf:
+            outf.write(html)
+        return {'render': render_done - start,
+                'text': text_done - render_done,
+                'write': time.perf_counter() - text_done}
 
+    def get_outfn(self, info):
+        """Return the output filename of a page."""
+        fn = info['fn']
         # check if filename is overriden
         if info.get('saveas') is not None:
             outfn = os.path.join(self.sitedir, info.get('saveas'))
         else:
             bfn, ext = os.path.splitext(fn)
             outfn = os.path.join(self.sitedir, bfn) + self.site['file_ext']
+        return outfn
 
-        with open(outfn, 'w', encoding='utf-8', errors='strict') as outf:
-            outf.write(html)
+    def lookup_output(self, info, outfn):
+        """Return the record of a previous rendering that is still valid.
+
+        A page has to be rendered again when it was converted again, when
+        its modification date has changed, when its layout may use the
+        content of other pages, or their modification dates when any of
+        those has changed. The output must not have changed since.
+        """
+        manifest = self.manifest
+        if manifest is None or not manifest.incremental:
+            return None
+        if info['id'] in self.converted or manifest.mdate_changed(info['id']):
+            return None
+        if self.shared_layouts is None:
+            self.shared_layouts = set()
+            self.mdate_layouts = set()
+            for layout in self.templates:
+                name = layout + '.html'
+                if uses_shared_content(self.env, name, self.project.filters):
+                    self.shared_layouts.add(layout)
+                if uses_shared_content(self.env, name, self.project.filters, ('mdate',)):
+                    self.mdate_layouts.add(layout)
+        if info['layout'] in self.shared_layouts:
+            return None
+        if manifest.mdates_changed and info['layout'] in self.mdate_layouts:
+            return None
+        record = manifest.lookup_output(os.path.relpath(outfn, self.sitedir))
+        if record is None:
+            return None
+        try:
+            st = os.stat(outfn)
+        except OSError:
+            return None
+        if record['stat'] != [st.st_mtime_ns, st.st_size]:
+            return None
+        if 'text' not in record:
+            # extract the text from the page, after a streaming build
+            text = None
+            if self.search:
+                with open(outfn, encoding='utf-8') as f:
+                    text = extract_text(f.read())
+            return {'text': self.keep_text(text)}
+        # the text may not have been extracted
+        if self.search and record['text'] is None:
+            return None
+        return {'text': self.keep_text(record['text'])}
 
     def extract_text(self, html, info):
+        # text is only needed for search content
+        if not self.search:
+            info['text'] = None
+            return
         # select main tag for search content
-        m = BeautifulSoup(html, "html.parser").select('main')
-        text = ""
-        if m:
-            text = m[0].get_text(" ", strip=True)
-        info['text'] = text
+        info['text'] = extract_text(html)
 
-    def make_tipuesearch_content(self):
-        tsd = os.path.join(self.sitedir, tipuesearchdir)
-        if not os.path.isdir(tsd):
-            return
-        tsc = os.path.join(tsd, tipuesearch_content)
-        items = []
+    def get_search_items(self):
+        """Generate the search items of the rendered pages."""
         # use tag index files if they have been rendered
         taglist = []
         if tag_layout in self.templates:
            taglist = self.taglist
         for info in itertools.chain(self.filelist, taglist):
-            if 'text' not in info:
+            if info.get('text') is None:
                 continue
             tags = ""
             if 'tags' in info:
                tags = ' '.join(info['tags'])
-            item = {'text' : info['text'],
+            item = {'text' : load_text(info['text']),
                     'title': info['title'],
                     'url'  : info['url'],
                     'tags' : tags}
-            items.append(item)
-        if len(items) <= 0:
+            yield item
+
+    def make_search_content(self):
+        self.make_tipuesearch_content()
+        self.make_search_index()
+
+    def make_tipuesearch_content(self):
+        tsd = os.path.join(self.sitedir, tipuesearchdir)
+        if not os.path.isdir(tsd):
+            return
+        tsc = os.path.join(tsd, tipuesearch_content)
+        items = self.get_search_items()
+        item = next(items, None)
+        if item is None:
             return
-        obj = {'pages': items}
+        text_limit = self.site.get('search_text_limit')
+        # write items one at a time, in the layout of
+        # json.dumps({'pages': items}, ensure_ascii=False, indent=4, sort_keys=True)
         with open(tsc, 'w', encoding='utf-8') as fd:
-            # json.dump is buggy in Python2 -- use workaround
-            # print json.dumps(obj, ensure_ascii=False, indent=4)
-            data = json.dumps(obj, ensure_ascii=False, indent=4, sort_keys=True)
-            fd.write(str(data))
+            fd.write('{\n    "pages": [\n')
+            sep = ''
+            for item in itertools.chain([item], items):
+                item['text'] = truncate_text(item['text'], text_limit)
+                data = json.dumps(item, ensure_ascii=False, indent=4, sort_keys=True)
+                fd.write(sep + textwrap.indent(data, ' ' * 8))
+                sep = ',\n'
+            fd.write('\n    ]\n}')
+
+    def make_search_index(self):
+        options = self.site.get('search_index')
+        if not options:
+            return
+        if not isinstance(options, dict):
+            options = {}
+        index = SearchIndex(
+            prefix_length=options.get('prefix_length', searchindex_prefix_length),
+            text_limit=self.site.get('search_text_limit', searchindex_text_limit))
+        for item in self.get_search_items():
+            index.add(item)
+        index.write(os.path.join(self.sitedir, searchindexdir))
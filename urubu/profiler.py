@@ -0,0 +1,135 @@
+# Copyright 2026 Jan Decaluwe
+#
+# This file is part of Urubu.
+#
+# Urubu is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Urubu is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Urubu.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import json
+import time
+import contextlib
+import collections
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# per-page steps, in processing order
+page_steps = ('jinja', 'markdown', 'render', 'text', 'write')
+
+
+def get_cpu_time():
+    """Return the cpu time of the process and its finished children."""
+    t = time.process_time()
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        t += usage.ru_utime + usage.ru_stime
+    return t
+
+
+def get_peak_memory():
+    """Return the peak resident memory of the process and its children, in bytes."""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # kilobytes, except on macOS
+    if sys.platform != 'darwin':
+        peak *= 1024
+    return peak
+
+
+class Profiler(object):
+
+    """Record the time and memory use of the phases of a build.
+
+    Phases can be nested. For each phase, the wall time, the cpu time
+    and the increase of the peak memory of the process are recorded.
+    The increase is the memory that a phase needed on top of the peak
+    of all phases before it. The peak memory of the whole build is
+    reported separately. Per-page timings of the processing steps are
+    added separately, and the slowest pages per step are reported.
+    """
+
+    def __init__(self, slowest=10):
+        self.slowest = slowest
+        self.phases = []
+        self.stack = []
+        self.pages = collections.defaultdict(list)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        self.stack.append(name)
+        record = {'name': '.'.join(self.stack), 'depth': len(self.stack) - 1}
+        self.phases.append(record)
+        wall = time.perf_counter()
+        cpu = get_cpu_time()
+        peak = get_peak_memory()
+        try:
+            yield
+        finally:
+            record['wall'] = time.perf_counter() - wall
+            record['cpu'] = get_cpu_time() - cpu
+            record['peak_increase'] = None
+            if peak is not None:
+                record['peak_increase'] = get_peak_memory() - peak
+            self.stack.pop()
+
+    def add_timings(self, id, timings):
+        """Add the step timings of a page."""
+        for step, seconds in timings.items():
+            self.pages[step].append((seconds, id))
+
+    def get_report(self):
+        steps = {}
+        for step in page_steps:
+            if step not in self.pages:
+                continue
+            timings = self.pages[step]
+            slowest = sorted(timings, key=lambda t: (-t[0], t[1]))[:self.slowest]
+            steps[step] = {'pages': len(timings),
+                           'total': sum(t[0] for t in timings),
+                           'slowest': [{'id': id, 'time': t} for t, id in slowest]}
+        return {'peak_memory': get_peak_memory(), 'phases': self.phases, 'steps': steps}
+
+    def write(self, fn):
+        with open(fn, 'w', encoding='utf-8') as f:
+            json.dump(self.get_report(), f, indent=2)
+
+    def get_summary(self):
+        report = self.get_report()
+        lines = ["{:<32} {:>9} {:>9} {:>10}".format('phase', 'wall (s)', 'cpu (s)', 'peak +MB')]
+        for p in report['phases']:
+            name = '  ' * p['depth'] + p['name'].rsplit('.', 1)[-1]
+            peak = ''
+            if p['peak_increase'] is not None:
+                peak = "{:.1f}".format(p['peak_increase'] / 2**20)
+            lines.append("{:<32} {:>9.3f} {:>9.3f} {:>10}".format(
+                name, p['wall'], p['cpu'], peak))
+        if report['peak_memory'] is not None:
+            lines.append("peak memory: {:.1f} MB".format(report['peak_memory'] / 2**20))
+        for step, s in report['steps'].items():
+            lines.append("")
+            lines.append("{}: {} pages, {:.3f}s".format(step, s['pages'], s['total']))
+            for page in s['slowest'][:3]:
+                lines.append("  {:.4f}s  {}".format(page['time'], page['id']))
+        return '\n'.join(lines)
+
+
+def phase(profiler, name):
+    """Return a context that records a phase, if there is a profiler."""
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.phase(name)
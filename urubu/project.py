@@ -16,19 +16,27 @@
 # along with Urubu.  If not, see <http://www.gnu.org/licenses/>.
 
 import os, sys
-import yaml
-import fnmatch
 import shutil
 import datetime
+import hashlib
 import itertools
 import importlib
+import pickle
+import threading
 from operator import itemgetter
 
 from urubu import UrubuWarning, UrubuError, urubu_warn, _warning, _error
-from urubu import readers, processors
-
-from urubu.config import (siteinfofn, sitedir,
-                          tagdir, tagid, tagindexid, tag_layout)
+from urubu import readers
+from urubu.manifest import Manifest, get_state, hash_info
+from urubu.sync import AssetSync, compile_patterns
+from urubu.compress import Precompressor
+from urubu.links import LinkChecker
+from urubu.profiler import Profiler, phase
+
+from urubu.config import (siteinfofn, sitedir, manifestfn, source_cache_size,
+                          cachedir, tagdir, tagid, tagindexid, tag_layout,
+                          profilefn, profile_slowest, precompress_min_size,
+                          precompress_skip, discovery_threads)
 
 def require_key(key, mapping, tipe, fn):
     type_error = "{}: '{}' value should be of type {}"
@@ -37,10 +45,6 @@ def require_key(key, mapping, tipe, fn):
             raise TypeError(type_error.format(fn, key, tipe))
 
 
-def get_relpath(path, start):
-    return os.path.relpath(path, start)
-
-
 def get_components(path, hasext=True):
     p = path
     if hasext:
@@ -59,6 +63,13 @@ def make_id(components, lowercased=True):
     return id
 
 
+def get_mdate(info):
+    """Return the modification date of a page as a string, or None."""
+    if 'mdate' in info:
+        return str(info['mdate'])
+    return None
+
+
 def make_clean(dir):
     for fn in os.listdir(dir):
         p = os.path.join(dir, fn)
@@ -80,6 +91,12 @@ class Project(object):
                      }
         self.sitedir = sitedir
         self.get_siteinfo()
+        # persistent caches can be disabled in the site info
+        self.cachedir = None
+        if self.site.get('cache', True):
+            self.cachedir = os.path.join(self.cwd, cachedir)
+        # reflinks defined in the site info
+        self.sitereflinks = self.site['reflinks'].copy()
 
         """Get user-defined python hooks."""
         # load _python module from cwd 
@@ -92,24 +109,52 @@ class Project(object):
         # overwrite placeholder method if function found
         self.process_info = getattr(_python, 'process_info', self.process_info)
 
+        # kept alive between builds of a long-lived project
+        self.manifest = None
+        self.processor = None
+        # records the phases of a build when set
+        self.profiler = None
+        self.reset()
+
+    def reset(self):
+        """Reset the content info, so that the content can be processed again."""
         self.filelist = []
         self.navlist = []
         self.taglist = []
         self.tagmap = {}
+        # navigation tree: the content items of each folder, keyed by
+        # the components of the folder
+        self.children = {}
         self.layouts = []
         # anchors to be filled in by markdown processor
         self.anchors = set()
+        # hash of the discovered content metadata, in total and per file
+        self.contenthash = None
+        self.infohashes = {}
+        # modification dates of the pages, keyed by id
+        self.mdates = {}
+        # body position and body of the content files, read during
+        # discovery. Bodies are only kept up to a total size.
+        self.sources = {}
+        self.source_budget = source_cache_size
+        self.site['reflinks'] = self.sitereflinks.copy()
 
     def process_info(self, info, site):
         """Plugin placeholder"""
         pass
 
+    def clear_caches(self):
+        """Remove the persistent caches, and the processor that uses them."""
+        self.processor = None
+        if self.cachedir is not None and os.path.isdir(self.cachedir):
+            shutil.rmtree(self.cachedir)
+
     def get_siteinfo(self):
         """Get the siteinfo from the yaml data file."""
         if not os.path.isfile(siteinfofn):
             return
         with open(siteinfofn, encoding='utf-8-sig') as f:
-            meta = yaml.safe_load(f)
+            meta = readers.load_yaml(f)
         # validate the site reflinks and add them
         if 'reflinks' in meta:
             for id in meta['reflinks']:
@@ -145,32 +190,131 @@ class Project(object):
             url = '/' + self.site['baseurl'] + url
         return url
 
-    def get_contentinfo(self):
-        """Get info from the markdown content files."""
-        pattern = '*.md'
-        ignore_patterns = self.get_ignore_patterns()
-        for path, dirnames, filenames in os.walk(self.cwd):
-            relpath = get_relpath(path, self.cwd)
-            if any(fnmatch.fnmatch(relpath, ip) for ip in ignore_patterns):
+    def walk_content(self, ignore):
+        """Generate the folders of the project, with their files.
+
+        Folders are visited top-down as with os.walk, and generated as
+        (relpath, entries) tuples, with the directory entries of the
+        files. Ignored folders are not entered.
+        """
+        stack = [os.curdir]
+        while stack:
+            relpath = stack.pop()
+            if ignore(relpath):
+                continue
+            dirs = []
+            files = []
+            try:
+                it = os.scandir(os.path.join(self.cwd, relpath))
+            except OSError:
                 continue
+            with it:
+                for entry in it:
+                    try:
+                        isdir = entry.is_dir()
+                    except OSError:
+                        isdir = False
+                    if not isdir:
+                        files.append(entry)
+                    elif not entry.is_symlink():
+                        dirs.append(os.path.normpath(os.path.join(relpath, entry.name)))
+            yield relpath, files
+            stack.extend(reversed(dirs))
 
-            content_found = index_found = False
-            for fn in filenames:
-                if fnmatch.fnmatch(fn, pattern):
+    def get_contentinfo(self):
+        """Get info from the markdown content files.
+
+        The candidate files are enumerated first. Their frontmatter is
+        then read concurrently in a thread pool, as discovery mostly waits
+        on I/O, and the results are merged in walk order. With the
+        project index, the frontmatter of unchanged files is reused,
+        without reading them.
+        """
+        threads = self.site.get('discovery_threads', discovery_threads)
+        if not isinstance(threads, int) or isinstance(threads, bool) or threads < 1:
+            raise UrubuError(_error.invalid_value, msg='discovery_threads', fn=siteinfofn)
+        is_content = compile_patterns(['*.md'])
+        ignore = compile_patterns(self.get_ignore_patterns())
+        contenthash = hashlib.sha1()
+        index = None
+        if self.cachedir is not None:
+            # only loaded when content is discovered
+            from urubu.index import ProjectIndex, get_inputs
+            index = ProjectIndex(os.path.join(self.cachedir, 'index.sqlite'))
+            index.load(get_inputs())
+        folders = []
+        # the files that are not indexed, to be read
+        candidates = []
+        fns = set()
+        for relpath, entries in self.walk_content(ignore):
+            files = []
+            for entry in entries:
+                fn = entry.name
+                if is_content(fn):
                     # normalize to convert ./foo into foo
                     # to avoid problems with ignore_patterns matching
                     relfn = os.path.normpath(os.path.join(relpath, fn))
-                    if any(fnmatch.fnmatch(relfn, ip) for ip in ignore_patterns):
+                    if ignore(relfn):
                         continue
-                    meta = readers.get_yamlfm(relfn)
+                    fns.add(relfn)
+                    # stat before reading, so that later changes are detected
+                    st = entry.stat()
+                    record = None
+                    if index is not None:
+                        record = index.get(relfn, st)
+                    if record is not None:
+                        meta, pos = record
+                        record = meta, pos, None, st
+                    else:
+                        candidates.append((relfn, st))
+                    files.append((fn, relfn, record))
+            folders.append((relpath, files))
+        budget_lock = threading.Lock()
+
+        def read_source(candidate):
+            relfn, st = candidate
+            meta, pos, body = readers.read_yamlfm(relfn, maxbody=self.source_budget)
+            if body is not None:
+                with budget_lock:
+                    if len(body) <= self.source_budget:
+                        self.source_budget -= len(body)
+                    else:
+                        body = None
+            return meta, pos, body, st
+
+        pool = None
+        if threads > 1 and len(candidates) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            pool = ThreadPoolExecutor(max_workers=threads)
+            # map yields in order, and reraises errors in order
+            results = pool.map(read_source, candidates)
+        else:
+            results = map(read_source, candidates)
+        # records of new or changed files, for the index
+        changed = {}
+        try:
+            for relpath, files in folders:
+                content_found = index_found = False
+                for fn, relfn, record in files:
+                    indexed = record is not None
+                    if not indexed:
+                        record = next(results)
+                    meta, pos, body, st = record
                     if meta is None:
                         urubu_warn(_warning.no_yamlfm, fn=relfn)
                         continue
+                    if index is not None and not indexed:
+                        changed[relfn] = (st, pos, pickle.dumps(meta, pickle.HIGHEST_PROTOCOL))
+                    self.sources[relfn] = (pos, body)
                     fileinfo = self.make_fileinfo(relfn, meta)
                     self.filelist.append(fileinfo)
                     self.process_info(fileinfo, self.site)
                     # validate after file info has been added so it can be used
-                    self.validate_fileinfo(fileinfo)
+                    self.validate_fileinfo(fileinfo, st.st_mtime)
+                    infohash = self.infohashes[relfn] = hash_info(fileinfo)
+                    contenthash.update(infohash.encode('ascii'))
+                    if 'mdate' in fileinfo:
+                        self.mdates[fileinfo['id']] = get_mdate(fileinfo)
                     self.add_reflink(fileinfo['id'], fileinfo)
                     if fn == 'index.md':
                         index_found = True
@@ -185,11 +329,30 @@ class Project(object):
                         content_found = True
                         # add id for non-index files to tag tags
                         self.add_info_to_tagmap(fileinfo)
-            # a folder with content but no index is an error
-            if content_found and not index_found:
-                raise UrubuError(_error.no_index, msg='', fn=relpath)
+                # a folder with content but no index is an error
+                if content_found and not index_found:
+                    raise UrubuError(_error.no_index, msg='', fn=relpath)
+            if index is not None:
+                index.update(changed, fns, self.site['reflinks'], self.tagmap)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+        self.contenthash = contenthash.hexdigest()
+        self.make_navtree()
+
+    def make_navtree(self):
+        """Index the content files and folders by their parent folder."""
+        self.children = {}
+        for item in itertools.chain(self.filelist, self.navlist):
+            comps = item['components']
+            if not comps or comps[-1] == 'index':
+                continue
+            parent = tuple(comps[:-1])
+            if parent not in self.children:
+                self.children[parent] = []
+            self.children[parent].append(item)
 
-    def validate_fileinfo(self, info):
+    def validate_fileinfo(self, info, mtime=None):
         fn = info['fn']
         # layout is mandatory
         if 'layout' not in info:
@@ -198,8 +361,9 @@ class Project(object):
             return
         layout = info['layout']
         # modification date, always available
-        t = os.path.getmtime(fn)
-        info['mdate'] = datetime.date.fromtimestamp(t)
+        if mtime is None:
+            mtime = os.path.getmtime(fn)
+        info['mdate'] = datetime.date.fromtimestamp(mtime)
         # first run a validator if it exist
         if layout in self.validators:
             self.validators[layout](info)
@@ -328,24 +492,15 @@ class Project(object):
 
     def get_content(self, info):
         """Infer sorted content of a folder."""
-        reflinks = self.site['reflinks']
-        refcontent = []
         key = info['order']
         reverse = info.get('reverse', False)
-        navcomps = info['components']
-
-        def pred(item):
-            itemcomps = item['components']
-            if len(itemcomps) == len(navcomps) + 1 and \
-               itemcomps[:-1] == navcomps and \
-               itemcomps[-1] != 'index' and \
-               item['layout'] is not None:
-                if key not in item:
-                    raise UrubuError(_error.undef_key, msg=key, fn=item['fn'])
-                return True
-            return False
-        allinfo = itertools.chain(self.filelist, self.navlist)
-        refcontent = filter(pred, allinfo)
+        refcontent = []
+        for item in self.children.get(tuple(info['components']), []):
+            if item['layout'] is None:
+                continue
+            if key not in item:
+                raise UrubuError(_error.undef_key, msg=key, fn=item['fn'])
+            refcontent.append(item)
 
         def get_keyval(item):
             return item[key]
@@ -353,18 +508,24 @@ class Project(object):
         info['content'] = refcontent
 
     def make_breadcrumbs(self):
+        # breadcrumbs per folder, shared by its files
+        folders = {(): []}
+
+        def get_breadcrumbs(comps):
+            key = tuple(comps)
+            if key not in folders:
+                parent = get_breadcrumbs(comps[:-1])
+                folders[key] = parent + [self.site['reflinks'][make_id(comps)]]
+            return folders[key]
+
         for info in self.filelist:
-            breadcrumbs = []
-            id = ''
             comps = info['components']
             # discard index
             if comps[-1] == 'index':
-                comps = comps[:-1]
-            for comp in comps:
-                id = id + '/' + comp
-                id = id.lower()
-                breadcrumbs.append(self.site['reflinks'][id])
-            info['breadcrumbs'] = breadcrumbs
+                info['breadcrumbs'] = list(get_breadcrumbs(comps[:-1]))
+            else:
+                info['breadcrumbs'] = get_breadcrumbs(comps[:-1]) + \
+                    [self.site['reflinks'][make_id(comps)]]
 
     def make_pager(self):
         for info in self.navlist:
@@ -419,6 +580,24 @@ class Project(object):
         if tagindexid in self.site['reflinks']:
             self.site['reflinks'][tagindexid]['content'] = self.taglist
 
+    def get_order_mdates(self):
+        """Return the modification dates that the order of content depends on.
+
+        Tag content is ordered by date, with the modification date as a
+        fallback, and folder content can be ordered by modification date.
+        """
+        mdates = {}
+        for infos in self.tagmap.values():
+            for info in infos:
+                if 'date' not in info:
+                    mdates[info['id']] = get_mdate(info)
+        for info in self.navlist:
+            if info.get('order') == 'mdate':
+                for item in info['content']:
+                    if 'id' in item:
+                        mdates[item['id']] = get_mdate(item)
+        return mdates
+
     def get_ignore_patterns(self):
         ignore_patterns = ('.?*', '_*', 'Makefile')
         if 'ignore_patterns' in self.site:
@@ -436,55 +615,189 @@ class Project(object):
                 if not ar in self.anchors:
                     urubu_warn(_warning.undef_anchor, msg=ar, fn=info['id'] )
 
-    def make_site(self):
-        """Make the site."""
+    def make_site(self, clean=False, jobs=1, stream=False):
+        """Make the site.
+
+        Unless a clean build is requested, the build manifest of the
+        previous build is used to only convert and render the pages
+        whose inputs have changed. With more than one job, content
+        processing is spread over a pool of worker processes. In
+        streaming mode, converted content is spilled to a temporary
+        store, so that memory use doesn't grow with the site size.
+        """
         # Keep sitedir alive if it exists, for the server
         if not os.path.exists(self.sitedir):
             os.mkdir(self.sitedir)
-        make_clean(self.sitedir)
-        ignore_patterns = self.get_ignore_patterns() + ('*.md',)
-        ignore = shutil.ignore_patterns(*ignore_patterns)
-        for fn in os.listdir(self.cwd):
-            if any(fnmatch.fnmatch(fn, ip) for ip in ignore_patterns):
-                continue
-            wp = os.path.join(self.cwd, fn)
-            sp = os.path.join(self.sitedir, fn)
-            if os.path.isdir(wp):
-                shutil.copytree(wp, sp, ignore=ignore)
-            elif os.path.isfile(wp):
-                shutil.copyfile(wp, sp)
-
-        # explicit files to keep
-        for fn in self.get_keep_files():
-            wp = os.path.join(self.cwd, fn)
-            sp = os.path.join(self.sitedir, fn)
-            if os.path.isfile(wp):
-                shutil.copyfile(wp, sp)
+        # a long-lived project keeps its manifest in memory
+        manifest = self.manifest
+        if manifest is None or clean:
+            manifest = self.manifest = Manifest(os.path.join(self.sitedir, manifestfn))
+            if not clean:
+                manifest.load()
+        manifest.set_state(get_state(self))
+        manifest.set_mdates(self.mdates)
+        if clean:
+            make_clean(self.sitedir)
+        # pages that are not rendered again are kept in the site
+        keep = set([manifestfn])
+        if manifest.incremental:
+            keep.update(manifest.get_outputs())
+        if self.site.get('precompress'):
+            keep.update(relfn + '.gz' for relfn in manifest.get_compressed())
+        with phase(self.profiler, 'sync_assets'):
+            self.sync_assets(keep)
 
         # make tag index dirs
         if self.taglist:
             tagpath = os.path.join(self.sitedir, tagdir)
-            if not os.path.isdir(tagpath):
-                os.mkdir(tagpath)
             for taginfo in self.taglist:
-                os.mkdir(os.path.join(tagpath, taginfo['tag']))
-        self.process_content()
+                os.makedirs(os.path.join(tagpath, taginfo['tag']), exist_ok=True)
+        self.process_content(manifest, jobs, stream)
         self.check_anchor_links()
-
-    def process_content(self):
+        if self.site.get('precompress'):
+            with phase(self.profiler, 'precompress'):
+                self.precompress(manifest)
+        with phase(self.profiler, 'save_manifest'):
+            manifest.save()
+
+    def sync_assets(self, keep=()):
+        """Synchronize the assets with the site, and prune stale files.
+
+        Only new or changed assets are copied. All other files in the
+        site are removed, except for the files in keep.
+        """
+        sync = AssetSync(self.cwd, self.sitedir,
+                         self.get_ignore_patterns() + ('*.md',),
+                         keep_files=self.get_keep_files(),
+                         link=self.site.get('asset_link', 'copy'),
+                         compare=self.site.get('asset_compare', 'mtime'))
+        sync.scan()
+        sync.prune(keep)
+        sync.copy()
+
+    def precompress(self, manifest):
+        """Write gzip compressed siblings of the site files.
+
+        Compressed files whose source is unchanged are kept.
+        """
+        compressor = Precompressor(self.sitedir, precompress_min_size, precompress_skip)
+        manifest.set_compressed(compressor.compress(manifest.get_compressed()))
+
+    def process_content(self, manifest=None, jobs=1, stream=False):
         """Process the content files."""
-        p = processors.ContentProcessor(self.sitedir, project=self)
+        p = self.processor
+        if p is None:
+            # the processing libraries are only loaded when needed
+            from urubu import processors
+            p = self.processor = processors.ContentProcessor(
+                self.sitedir, project=self, manifest=manifest, jobs=jobs,
+                stream=stream)
+        else:
+            p.update(self, manifest=manifest, jobs=jobs, stream=stream)
         p.process()
 
-def load():
+    def update_content(self, fns):
+        """Update the site after changes to the body of content files.
+
+        This only works after a site has been made. If the metadata of
+        any of the files has changed, nothing is done and False is
+        returned. The modification date counts as metadata here. Otherwise,
+        only the changed files and the pages that depend on their content
+        are processed again.
+        """
+        if self.processor is None or self.manifest is None:
+            return False
+        sources = {}
+        for fn in fns:
+            if fn not in self.infohashes:
+                return False
+            meta, pos, body = readers.read_yamlfm(fn)
+            if meta is None:
+                return False
+            info = self.make_fileinfo(fn, meta)
+            self.process_info(info, self.site)
+            self.validate_fileinfo(info)
+            if hash_info(info) != self.infohashes[fn]:
+                return False
+            if get_mdate(info) != self.mdates.get(info['id']):
+                return False
+            sources[fn] = (pos, body)
+        self.sources.update(sources)
+        self.processor.update_content(fns)
+        self.check_anchor_links()
+        if self.site.get('precompress'):
+            self.precompress(self.manifest)
+        self.manifest.save()
+        return True
+
+def load(content=False):
+    """Load the project in the current directory.
+
+    With content, the content info is discovered too, and the reflinks
+    are resolved. With the project index, this only reads the files
+    that have changed since the previous discovery.
+    """
     proj = Project()
+    if content:
+        proj.get_contentinfo()
+        proj.resolve_reflinks()
+    return proj
+
+def make(proj, clean=False, jobs=1, stream=False):
+    """Make the site of a loaded project.
+
+    A clean build starts from scratch, without the previous build and
+    without the persistent caches.
+    """
+    profiler = proj.profiler
+    if clean:
+        proj.clear_caches()
+    if stream:
+        # bodies are read again when they are converted
+        proj.source_budget = 0
+    with phase(profiler, 'get_contentinfo'):
+        proj.get_contentinfo()
+    with phase(profiler, 'resolve_reflinks'):
+        proj.resolve_reflinks()
+    with phase(profiler, 'make_breadcrumbs'):
+        proj.make_breadcrumbs()
+    with phase(profiler, 'make_pager'):
+        proj.make_pager()
+    with phase(profiler, 'process_tags'):
+        proj.process_tags()
+    with phase(profiler, 'make_site'):
+        proj.make_site(clean=clean, jobs=jobs, stream=stream)
+
+def build(clean=False, jobs=1, profile=False, stream=False):
+    """Build the site of the project in the current directory.
+
+    With profile, the time and memory use of the build are written to
+    a report, and the profiler is kept with the returned project. With
+    stream, memory use is bounded by the page size instead of the site
+    size.
+    """
+    profiler = None
+    if profile:
+        profiler = Profiler(slowest=profile_slowest)
+    with phase(profiler, 'build'):
+        with phase(profiler, 'load'):
+            proj = load()
+        proj.profiler = profiler
+        make(proj, clean=clean, jobs=jobs, stream=stream)
+    if profiler is not None:
+        profiler.write(profilefn)
     return proj
 
-def build():
+def check_links(jobs=1):
+    """Check the internal links in the built site of the project.
+
+    All html pages in the site are checked, including the pages
+    generated from layouts. The broken links are returned as
+    (page, line, url, reason) tuples, with the number of pages.
+    """
     proj = load()
-    proj.get_contentinfo()
-    proj.resolve_reflinks()
-    proj.make_breadcrumbs()
-    proj.make_pager()
-    proj.process_tags()
-    proj.make_site()
+    checker = LinkChecker(proj.sitedir, proj.site['baseurl'],
+                          proj.site['file_ext'], jobs=jobs,
+                          ignore_patterns=proj.get_ignore_patterns())
+    broken = checker.check()
+    return broken, len(checker.ids)
@@ -15,33 +15,73 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with Urubu.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import yaml
 import re
 
+# the libyaml loader is much faster, with the same results
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+def load_yaml(stream):
+    """Load yaml safely, like yaml.safe_load."""
+    return yaml.load(stream, Loader=SafeLoader)
+
 def get_yamlfm(fn):
     """Return the yaml frontmatter."""
     info = _get_yamlfm_helper(fn)
     return info
 
 
+def read_yamlfm(fn, maxbody=None):
+    """Return the yaml frontmatter, the body position, and the body.
+
+    The file is read in a single pass. The body is only returned if the
+    file is not larger than maxbody characters; otherwise it is None, and
+    the body can be read later from the body position with read_body().
+    """
+    with open(fn, 'r', encoding='utf-8-sig') as f:
+        meta = _parse_yamlfm(f)
+        if meta is None:
+            return None, None, None
+        pos = f.tell()
+        body = None
+        if maxbody is None or os.fstat(f.fileno()).st_size <= maxbody:
+            body = f.read()
+    return meta, pos, body
+
+
+def read_body(fn, pos):
+    """Return the body of a file, starting from its body position."""
+    with open(fn, 'r', encoding='utf-8-sig') as f:
+        f.seek(pos)
+        return f.read()
+
+
 def _get_yamlfm_helper(fn):
     with open(fn, 'r', encoding='utf-8-sig') as f:
+        return _parse_yamlfm(f)
+
+
+def _parse_yamlfm(f):
+    line = f.readline()
+    if line.strip() != '---':
+        return None
+    lines = []
+    while True:
         line = f.readline()
-        if line.strip() != '---':
+        if not line:
             return None
-        lines = []
-        while True:
-            line = f.readline()
-            if not line:
-                return None
-            elif line.strip() == '---':
-                s = ''.join(lines)
-                meta = yaml.safe_load(s)
-                if isinstance(meta, dict):
-                    return meta
-                else:
-                    return None
+        elif line.strip() == '---':
+            s = ''.join(lines)
+            meta = load_yaml(s)
+            if isinstance(meta, dict):
+                return meta
             else:
-                lines.append(line)
-
+                return None
+        else:
+            lines.append(line)
 
@@ -0,0 +1,134 @@
+/*
+ * Client loader for the sharded search index of an Urubu site.
+ *
+ * Usage:
+ *
+ *     var index = new UrubuSearch('/search/');
+ *     index.search('some query').then(function (results) {
+ *         // results: [{title: ..., url: ..., text: ..., score: ...}, ...]
+ *     });
+ *
+ * Only the document table and the shards of the query terms are
+ * loaded. A query term matches all terms in the index that start with
+ * it, and a page matches when it matches all query terms.
+ */
+var UrubuSearch = (function () {
+    'use strict';
+
+    // the same terms as in the index: words of at least two characters
+    var termRe = /[\p{L}\p{N}_]{2,}/gu;
+
+    function UrubuSearch(base) {
+        this.base = base.replace(/\/?$/, '/');
+        this.meta = null;
+        this.shards = {};
+    }
+
+    UrubuSearch.prototype.fetchJSON = function (name) {
+        return fetch(this.base + name).then(function (response) {
+            if (!response.ok) {
+                throw new Error('Cannot load ' + name + ': ' + response.status);
+            }
+            return response.json();
+        });
+    };
+
+    UrubuSearch.prototype.loadMeta = function () {
+        if (this.meta === null) {
+            this.meta = this.fetchJSON('index.json');
+        }
+        return this.meta;
+    };
+
+    UrubuSearch.prototype.loadShard = function (name) {
+        if (!(name in this.shards)) {
+            this.shards[name] = this.fetchJSON(name + '.json');
+        }
+        return this.shards[name];
+    };
+
+    UrubuSearch.prototype.getTerms = function (query) {
+        return query.toLowerCase().match(termRe) || [];
+    };
+
+    UrubuSearch.prototype.getShard = function (term, prefixLength) {
+        var prefix = Array.from(term).slice(0, prefixLength).join('');
+        var bytes = new TextEncoder().encode(prefix);
+        return Array.from(bytes, function (b) {
+            return ('0' + b.toString(16)).slice(-2);
+        }).join('');
+    };
+
+    // return an object that maps docids to the scores for a query term
+    function matchTerm(term, shard) {
+        var scores = {};
+        Object.keys(shard).forEach(function (t) {
+            if (t.lastIndexOf(term, 0) !== 0) {
+                return;
+            }
+            var postings = shard[t];
+            for (var i = 0; i < postings.length; i += 2) {
+                scores[postings[i]] = (scores[postings[i]] || 0) + postings[i + 1];
+            }
+        });
+        return scores;
+    }
+
+    // return the names of the shards that may hold terms that start
+    // with a query term: a term shorter than the prefix length is the
+    // prefix of the terms in all shards whose names start with its shard
+    UrubuSearch.prototype.getShards = function (term, meta) {
+        var name = this.getShard(term, meta.prefix_length);
+        if (Array.from(term).length >= meta.prefix_length) {
+            return meta.shards.indexOf(name) >= 0 ? [name] : [];
+        }
+        return meta.shards.filter(function (s) {
+            return s.lastIndexOf(name, 0) === 0;
+        });
+    };
+
+    UrubuSearch.prototype.search = function (query) {
+        var self = this;
+        var terms = this.getTerms(query);
+        return this.loadMeta().then(function (meta) {
+            return Promise.all(terms.map(function (term) {
+                var names = self.getShards(term, meta);
+                return Promise.all(names.map(function (name) {
+                    return self.loadShard(name).then(function (shard) {
+                        return matchTerm(term, shard);
+                    });
+                })).then(function (shardMatches) {
+                    // the terms of different shards are different
+                    var scores = {};
+                    shardMatches.forEach(function (m) {
+                        Object.keys(m).forEach(function (docid) {
+                            scores[docid] = (scores[docid] || 0) + m[docid];
+                        });
+                    });
+                    return scores;
+                });
+            })).then(function (matches) {
+                if (!matches.length) {
+                    return [];
+                }
+                var results = [];
+                Object.keys(matches[0]).forEach(function (docid) {
+                    var score = 0;
+                    for (var i = 0; i < matches.length; i++) {
+                        if (!(docid in matches[i])) {
+                            return;
+                        }
+                        score += matches[i][docid];
+                    }
+                    var doc = meta.docs[docid];
+                    results.push({title: doc[0], url: doc[1], text: doc[2],
+                                  score: score});
+                });
+                results.sort(function (a, b) { return b.score - a.score; });
+                return results;
+            });
+        });
+    };
+
+    return UrubuSearch;
+})();
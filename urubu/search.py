@@ -0,0 +1,200 @@
+# Copyright 2026 Jan Decaluwe
+#
+# This file is part of Urubu.
+#
+# Urubu is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Urubu is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Urubu.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import re
+import json
+import shutil
+import collections
+from html.parser import HTMLParser
+
+from urubu import UrubuError, _error
+from urubu.config import (searchindex_meta, searchindex_loader,
+                          searchindex_prefix_length)
+
+# elements whose content is not text
+skip_tags = ('script', 'style', 'template')
+
+
+class _Done(Exception):
+    pass
+
+
+class TextExtractor(HTMLParser):
+
+    """Extract the text of the first main element of a html page.
+
+    The text is collected while parsing, without building a document
+    tree. Each text string is stripped, and the strings are joined with
+    a single space.
+    """
+
+    def __init__(self):
+        HTMLParser.__init__(self, convert_charrefs=True)
+        self.strings = []
+        self.data = []
+        # nesting depth of main and skipped elements
+        self.main = 0
+        self.skip = 0
+
+    def flush(self):
+        if self.data:
+            s = ''.join(self.data).strip()
+            if s and self.main and not self.skip:
+                self.strings.append(s)
+            self.data = []
+
+    def handle_starttag(self, tag, attrs):
+        self.flush()
+        if tag == 'main':
+            self.main += 1
+        elif tag in skip_tags and self.main:
+            self.skip += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self.flush()
+
+    def handle_endtag(self, tag):
+        self.flush()
+        if not self.main:
+            return
+        if tag == 'main':
+            self.main -= 1
+            if not self.main:
+                # the rest of the page is not needed
+                raise _Done
+        elif tag in skip_tags and self.skip:
+            self.skip -= 1
+
+    def handle_data(self, data):
+        if self.main:
+            self.data.append(data)
+
+    def handle_comment(self, data):
+        self.flush()
+
+    def unknown_decl(self, data):
+        self.flush()
+        if data.startswith('CDATA['):
+            self.handle_data(data[6:])
+            self.flush()
+
+    def get_text(self):
+        self.flush()
+        return ' '.join(self.strings)
+
+
+def extract_text(html):
+    """Return the text of the main element of a html page."""
+    parser = TextExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except _Done:
+        pass
+    return parser.get_text()
+
+
+def truncate_text(text, limit):
+    """Truncate a text to at most limit characters, at a word boundary."""
+    if limit is None or len(text) <= limit:
+        return text
+    text = text[:limit + 1]
+    head, sep, tail = text.rpartition(' ')
+    if sep:
+        return head
+    return text[:limit]
+
+
+# terms are words of at least two characters
+term_re = re.compile(r'\w\w+')
+
+def get_terms(text):
+    return term_re.findall(text.lower())
+
+
+class SearchIndex(object):
+
+    """Inverted index of the search content of a site.
+
+    The index is written as a small document table, and as shards of
+    the postings that are keyed by the prefix of the terms. A client
+    only loads the shards of the terms in a query.
+    """
+
+    # score of a term occurrence, per field
+    weights = (('title', 10), ('tags', 5), ('text', 1))
+
+    def __init__(self, prefix_length=searchindex_prefix_length, text_limit=None):
+        self.prefix_length = prefix_length
+        self.text_limit = text_limit
+        self.docs = []
+        self.postings = collections.defaultdict(dict)
+
+    def add(self, item):
+        """Add a search item with title, url, tags and text."""
+        docid = len(self.docs)
+        scores = collections.Counter()
+        for field, weight in self.weights:
+            for term in get_terms(item[field]):
+                scores[term] += weight
+        for term, score in scores.items():
+            self.postings[term][docid] = score
+        self.docs.append([item['title'], item['url'],
+                          truncate_text(item['text'], self.text_limit)])
+
+    def get_shards(self):
+        shards = collections.defaultdict(dict)
+        for term in sorted(self.postings):
+            postings = self.postings[term]
+            # flat list of docid, score pairs
+            shards[get_shard(term, self.prefix_length)][term] = [
+                x for docid in sorted(postings) for x in (docid, postings[docid])]
+        return shards
+
+    def write(self, path):
+        """Write the index to a directory, replacing a previous index.
+
+        A directory that doesn't hold an index, such as a content folder
+        with the same name, is never replaced.
+        """
+        if os.path.isdir(path):
+            if not (os.path.isfile(os.path.join(path, searchindex_meta)) and
+                    os.path.isfile(os.path.join(path, searchindex_loader))):
+                raise UrubuError(_error.search_dir, fn=path)
+            shutil.rmtree(path)
+        os.makedirs(path)
+        shards = self.get_shards()
+        for name, terms in shards.items():
+            write_json(os.path.join(path, name + '.json'), terms)
+        meta = {'prefix_length': self.prefix_length,
+                'shards': sorted(shards),
+                'docs': self.docs}
+        write_json(os.path.join(path, searchindex_meta), meta)
+        loader = os.path.join(os.path.dirname(__file__), searchindex_loader)
+        shutil.copyfile(loader, os.path.join(path, searchindex_loader))
+
+
+def get_shard(term, prefix_length):
+    """Return the shard name of a term: the hex encoded utf-8 prefix."""
+    return term[:prefix_length].encode('utf-8').hex()
+
+
+def write_json(fn, obj):
+    with open(fn, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False, separators=(',', ':'),
+                  sort_keys=True)
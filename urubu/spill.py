@@ -0,0 +1,135 @@
+# Copyright 2026 Jan Decaluwe
+#
+# This file is part of Urubu.
+#
+# Urubu is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Urubu is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Urubu.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+
+
+class SpillStore(object):
+
+    """Store of strings in a temporary file.
+
+    Strings are appended to the file, and read back by position. Reads
+    don't depend on the file offset, so forked worker processes can
+    read from the store while the parent process keeps it open.
+    """
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile()
+        self.size = 0
+
+    def put(self, s):
+        """Add a string, and return a lazy proxy for it."""
+        data = s.encode('utf-8')
+        pos = self.size
+        self.file.write(data)
+        self.size += len(data)
+        return LazyText(self, pos, len(data))
+
+    def flush(self):
+        self.file.flush()
+
+    def read(self, pos, n):
+        fd = self.file.fileno()
+        if hasattr(os, 'pread'):
+            return os.pread(fd, n, pos)
+        self.file.flush()
+        self.file.seek(pos)
+        data = self.file.read(n)
+        self.file.seek(0, os.SEEK_END)
+        return data
+
+    def get(self, pos, n):
+        self.flush()
+        return self.read(pos, n).decode('utf-8')
+
+    def close(self):
+        self.file.close()
+
+    def __del__(self):
+        # the store lives as long as the content that refers to it
+        self.close()
+
+
+class LazyText(object):
+
+    """A string in a spill store, loaded when it is used.
+
+    The proxy converts to the string, and delegates other operations to
+    it. Templates never see it: the content environment loads it when
+    it is looked up. Project filters never see it either, as content
+    is not spilled when a project defines filters.
+    """
+
+    __slots__ = ('store', 'pos', 'n')
+
+    def __init__(self, store, pos, n):
+        self.store = store
+        self.pos = pos
+        self.n = n
+
+    def load(self):
+        return self.store.get(self.pos, self.n)
+
+    def __str__(self):
+        return self.load()
+
+    def __bool__(self):
+        return self.n > 0
+
+    def __len__(self):
+        return len(self.load())
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def __getitem__(self, i):
+        return self.load()[i]
+
+    def __contains__(self, s):
+        return s in self.load()
+
+    def __add__(self, other):
+        return self.load() + other
+
+    def __radd__(self, other):
+        return other + self.load()
+
+    def __eq__(self, other):
+        if isinstance(other, LazyText):
+            other = other.load()
+        return self.load() == other
+
+    def __hash__(self):
+        return hash(self.load())
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+    def __repr__(self):
+        return repr(self.load())
+
+    def __reduce__(self):
+        # pickled, e.g. to worker processes, as a plain string
+        return (str, (self.load(),))
+
+
+def load_text(s):
+    """Return a string, loading it if needed."""
+    if isinstance(s, LazyText):
+        return s.load()
+    return s
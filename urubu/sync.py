@@ -0,0 +1,174 @@
+# Copyright 2026 Jan Decaluwe
+#
+# This file is part of Urubu.
+#
+# Urubu is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Urubu is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Urubu.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import re
+import shutil
+import fnmatch
+from concurrent.futures import ThreadPoolExecutor
+
+from urubu import UrubuError, _error
+from urubu.config import siteinfofn
+from urubu.manifest import hash_file
+
+# files in the top level of the site directory that are never removed
+protected = ('.git', 'CNAME')
+
+link_modes = ('copy', 'hardlink', 'reflink')
+compare_modes = ('mtime', 'hash')
+
+# linux ioctl to clone a file on copy-on-write filesystems
+FICLONE = 0x40049409
+
+
+def compile_patterns(patterns):
+    """Compile fnmatch patterns into a single matcher.
+
+    As with fnmatch.fnmatch, both the patterns and the names are
+    normalized to the case of the platform.
+    """
+    regex = '|'.join(fnmatch.translate(os.path.normcase(p)) for p in patterns)
+    if not regex:
+        return lambda name: False
+    match = re.compile(regex).match
+    return lambda name: match(os.path.normcase(name)) is not None
+
+
+def reflink(src, dst):
+    """Clone a file, falling back to a copy if cloning is not supported."""
+    try:
+        import fcntl
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        shutil.copystat(src, dst)
+    except (ImportError, OSError):
+        shutil.copy2(src, dst)
+
+
+class AssetSync(object):
+
+    """Synchronize the asset files of a project with the site directory.
+
+    Assets are all files in the project that are not ignored. Only new
+    or changed assets are copied, hard linked or reflinked, depending on
+    the link mode. An asset is unchanged when its size and modification
+    time are the same as in the site, or with the 'hash' compare mode,
+    when its size and content hash are the same.
+    """
+
+    def __init__(self, srcdir, dstdir, ignore_patterns, keep_files=(),
+                 link='copy', compare='mtime', jobs=None):
+        if link not in link_modes:
+            raise UrubuError(_error.invalid_value, msg='asset_link', fn=siteinfofn)
+        if compare not in compare_modes:
+            raise UrubuError(_error.invalid_value, msg='asset_compare', fn=siteinfofn)
+        self.srcdir = srcdir
+        self.dstdir = dstdir
+        self.ignore = compile_patterns(ignore_patterns)
+        self.keep_files = keep_files
+        self.link = link
+        self.compare = compare
+        self.jobs = jobs
+        self.files = {}
+        self.dirs = set()
+
+    def scan(self):
+        """Find the asset files and directories."""
+        dstdir = os.path.abspath(self.dstdir)
+        stack = ['']
+        while stack:
+            reldir = stack.pop()
+            with os.scandir(os.path.join(self.srcdir, reldir)) as it:
+                for entry in it:
+                    if self.ignore(entry.name):
+                        continue
+                    relfn = os.path.join(reldir, entry.name)
+                    if entry.is_dir():
+                        if os.path.abspath(entry.path) == dstdir:
+                            continue
+                        self.dirs.add(relfn)
+                        stack.append(relfn)
+                    elif entry.is_file():
+                        self.files[relfn] = entry.stat()
+        # explicit files to keep
+        for fn in self.keep_files:
+            p = os.path.join(self.srcdir, fn)
+            if os.path.isfile(p):
+                self.files[os.path.normpath(fn)] = os.stat(p)
+
+    def prune(self, keep=()):
+        """Remove all files from the site that are not assets or in keep."""
+        keep = set(keep)
+        keep.update(self.files)
+        for dirpath, dirnames, filenames in os.walk(self.dstdir, topdown=False):
+            reldir = os.path.relpath(dirpath, self.dstdir)
+            if reldir == os.curdir:
+                reldir = ''
+                dirnames = [d for d in dirnames if d not in protected]
+                filenames = [f for f in filenames if f not in protected]
+            elif reldir.split(os.sep)[0] in protected:
+                continue
+            for fn in filenames:
+                relfn = os.path.join(reldir, fn)
+                if relfn not in keep:
+                    os.remove(os.path.join(dirpath, fn))
+            if reldir and reldir not in self.dirs and not os.listdir(dirpath):
+                os.rmdir(dirpath)
+
+    def is_unchanged(self, relfn, st):
+        dst = os.path.join(self.dstdir, relfn)
+        try:
+            dst_st = os.stat(dst)
+        except OSError:
+            return False
+        if dst_st.st_size != st.st_size:
+            return False
+        if self.compare == 'hash':
+            return hash_file(os.path.join(self.srcdir, relfn)) == hash_file(dst)
+        return dst_st.st_mtime_ns == st.st_mtime_ns
+
+    def copy_file(self, relfn):
+        src = os.path.join(self.srcdir, relfn)
+        dst = os.path.join(self.dstdir, relfn)
+        if os.path.isdir(dst):
+            shutil.rmtree(dst)
+        elif os.path.lexists(dst):
+            os.remove(dst)
+        if self.link == 'hardlink':
+            try:
+                os.link(src, dst)
+                return
+            except OSError:
+                # e.g. across filesystems
+                pass
+        if self.link == 'reflink':
+            reflink(src, dst)
+        else:
+            shutil.copy2(src, dst)
+
+    def copy(self):
+        """Copy the new and changed assets. Return the number of copied files."""
+        for reldir in sorted(self.dirs):
+            os.makedirs(os.path.join(self.dstdir, reldir), exist_ok=True)
+        todo = [relfn for relfn, st in self.files.items()
+                if not self.is_unchanged(relfn, st)]
+        for relfn in todo:
+            os.makedirs(os.path.dirname(os.path.join(self.dstdir, relfn)), exist_ok=True)
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            # consume the results to raise errors
+            list(pool.map(self.copy_file, todo))
+        return len(todo)
@@ -1,4 +1,6 @@
-import contextlib, os
+import contextlib, os, shutil
+
+here = os.path.dirname(os.path.abspath(__file__))
 
 @contextlib.contextmanager
 def cd(path):
@@ -15,6 +17,18 @@ def cd(path):
         os.chdir(prev_cwd)
 
 
+def copy_project(name, tmp_path):
+    """Copy a test project to a temporary directory, without build results.
+
+    Tests build the copy, so that they start from scratch, and leave the
+    test project alone.
+    """
+    dst = os.path.join(str(tmp_path), name)
+    shutil.copytree(os.path.join(here, name), dst,
+                    ignore=shutil.ignore_patterns('_build', '.urubu_cache'))
+    return dst
+
+
 
 # reused from MyHDL
 import pytest
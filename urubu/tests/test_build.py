@@ -0,0 +1,427 @@
+import os, sys, gzip, json, shutil, fnmatch, filecmp, datetime, warnings
+
+from urubu import project, readers, manifest, UrubuWarning
+from urubu.index import ProjectIndex
+from urubu.watch import Watcher
+
+from urubu.tests import cd, copy_project
+
+def same_trees(dir1, dir2):
+    cmp = filecmp.dircmp(dir1, dir2, ignore=['.urubu_manifest.json'])
+    def check(cmp):
+        if cmp.left_only or cmp.right_only or cmp.diff_files or cmp.funny_files:
+            return False
+        return all(check(sub) for sub in cmp.subdirs.values())
+    return check(cmp)
+
+def edit(fn, old, new):
+    with open(fn) as f:
+        s = f.read()
+    with open(fn, 'w') as f:
+        f.write(s.replace(old, new))
+
+def test_incremental(tmp_path):
+    with cd(copy_project('incremental', tmp_path)):
+        project.build()
+        edit('other.md', 'The other page.', 'The edited other page.')
+        project.build()
+        shutil.copytree('_build', '_incremental')
+        project.build(clean=True)
+        assert same_trees('_build', '_incremental')
+        with open(os.path.join('_build', 'index.html')) as f:
+            assert 'The edited other page.' in f.read()
+
+def test_incremental_mdate(tmp_path):
+    day = 24 * 3600
+    with cd(copy_project('incremental', tmp_path)):
+        for fn in ('page.md', 'other.md'):
+            st = os.stat(fn)
+            os.utime(fn, (st.st_atime - 2 * day, st.st_mtime - 2 * day))
+        project.build()
+        other = os.path.join('_build', 'other.html')
+        mtime = os.stat(other).st_mtime_ns
+        # a new modification date only changes its own page
+        edit('page.md', 'The first page', 'The edited first page')
+        project.build()
+        assert os.stat(other).st_mtime_ns == mtime
+        # unless a layout reads the dates of other pages
+        edit(os.path.join('_layouts', 'index.html'), '{{item.body}}', '{{item.mdate}}')
+        project.build()
+        os.utime('other.md')
+        project.build()
+        shutil.copytree('_build', '_incremental')
+        project.build(clean=True)
+        assert same_trees('_build', '_incremental')
+        with open(os.path.join('_build', 'index.html')) as f:
+            assert str(datetime.date.today()) in f.read()
+
+def test_incremental_outputs(tmp_path):
+    with cd(copy_project('incremental', tmp_path)):
+        project.build()
+        # changed outputs are not reused
+        with open(os.path.join('_build', 'other.html'), 'w') as f:
+            f.write('stale')
+        project.build()
+        with open(os.path.join('_build', 'other.html')) as f:
+            assert 'The other page.' in f.read()
+
+def test_jobs(tmp_path):
+    with cd(copy_project('incremental', tmp_path)):
+        # without cached conversions, so that the workers convert
+        with open('_site.yml', 'a') as f:
+            f.write('cache: false\n')
+        project.build(clean=True)
+        shutil.copytree('_build', '_serial')
+        project.build(clean=True, jobs=2)
+        assert same_trees('_build', '_serial')
+
+def test_incremental_filters(tmp_path, monkeypatch):
+    # a project filter may read the content of other pages
+    with cd(copy_project('incremental', tmp_path)):
+        monkeypatch.syspath_prepend(os.getcwd())
+        with open('_python.py', 'w') as f:
+            f.write('def bodies(items):\n'
+                    '    return " ".join(item["body"] for item in items)\n'
+                    'filters = {"bodies": bodies}\n')
+        with open(os.path.join('_layouts', 'index.html'), 'w') as f:
+            f.write('<main>{{this.content|bodies}}</main>\n')
+        try:
+            project.build()
+            edit('other.md', 'The other page.', 'The edited other page.')
+            project.build()
+        finally:
+            sys.modules.pop('_python', None)
+        with open(os.path.join('_build', 'index.html')) as f:
+            assert 'The edited other page.' in f.read()
+
+def test_watch(tmp_path):
+    with cd(copy_project('incremental', tmp_path)):
+        watcher = Watcher()
+        watcher.start()
+        edit('other.md', 'The other page.', 'The edited other page.')
+        watcher.update(['other.md'])
+        edit('page.md', 'title: page', 'title: edited page')
+        watcher.update(['page.md'])
+        shutil.copytree('_build', '_watched')
+        project.build(clean=True)
+        assert same_trees('_build', '_watched')
+
+def test_watch_hooks_module(tmp_path, monkeypatch):
+    with cd(copy_project('incremental', tmp_path)):
+        monkeypatch.syspath_prepend(os.getcwd())
+        with open('_python.py', 'w') as f:
+            f.write('filters = {"mark": lambda s: s + "!"}\n')
+        edit(os.path.join('_layouts', 'page.html'), '{{this.title}}', '{{this.title|mark}}')
+        try:
+            watcher = Watcher()
+            watcher.start()
+            with open('_python.py', 'w') as f:
+                f.write('filters = {"mark": lambda s: s + "???"}\n')
+            watcher.update(['_python.py'])
+        finally:
+            sys.modules.pop('_python', None)
+        with open(os.path.join('_build', 'other.html')) as f:
+            assert 'other???' in f.read()
+
+def test_sync_assets(tmp_path):
+    with cd(copy_project('incremental', tmp_path)):
+        os.mkdir('img')
+        assets = [os.path.join('img', 'a.png'), os.path.join('img', 'b.png')]
+        for fn in assets:
+            with open(fn, 'w') as f:
+                f.write(fn)
+        project.build()
+        a = os.path.join('_build', 'img', 'a.png')
+        mtime = os.stat(a).st_mtime_ns
+        for fn in ('CNAME', 'stale.html'):
+            with open(os.path.join('_build', fn), 'w') as f:
+                f.write('x')
+        os.remove(os.path.join('img', 'b.png'))
+        project.build()
+        assert os.stat(a).st_mtime_ns == mtime
+        assert os.path.exists(os.path.join('_build', 'CNAME'))
+        assert not os.path.exists(os.path.join('_build', 'stale.html'))
+        assert not os.path.exists(os.path.join('_build', 'img', 'b.png'))
+        os.remove(os.path.join('_build', 'CNAME'))
+        shutil.copytree('_build', '_synced')
+        project.build(clean=True)
+        assert same_trees('_build', '_synced')
+
+def test_search_content(tmp_path):
+    with cd(copy_project('incremental', tmp_path)):
+        project.build()
+        assert not os.path.exists(os.path.join('_build', 'tipuesearch'))
+        os.mkdir('tipuesearch')
+        project.build()
+        with open(os.path.join('_build', 'tipuesearch', 'tipuesearch_content.json')) as f:
+            pages = json.load(f)['pages']
+        texts = dict((page['title'], page['text']) for page in pages)
+        assert texts['other'] == 'other The other page.'
+
+def test_profile(tmp_path):
+    with cd(copy_project('incremental', tmp_path)):
+        proj = project.build(profile=True)
+        with open('_profile.json') as f:
+            report = json.load(f)
+        names = [p['name'] for p in report['phases']]
+        assert 'build.make_site.render' in names
+        for step in ('jinja', 'markdown', 'render', 'text', 'write'):
+            assert report['steps'][step]['pages'] == 3
+        if report['peak_memory'] is not None:
+            # phases only add to the peak of the phases before them
+            phases = report['phases']
+            assert min(p['peak_increase'] for p in phases) >= 0
+            assert sum(p['peak_increase'] for p in phases if p['depth'] == 1) <= \
+                phases[0]['peak_increase']
+        assert 'render' in proj.profiler.get_summary()
+
+def test_navtree(tmp_path):
+    with cd(copy_project('navtree', tmp_path)):
+        project.build()
+        with open(os.path.join('_build', 'news', 'index.html')) as f:
+            assert '<p>b,sub,a,</p>' in f.read()
+        with open(os.path.join('_build', 'news', 'sub', 'index.html')) as f:
+            s = f.read()
+            assert '<p>news/sub/</p>' in s
+            assert '<p>c,d,</p>' in s
+        with open(os.path.join('_build', 'news', 'sub', 'c.html')) as f:
+            assert '<p>news/sub/c/</p>' in f.read()
+
+def test_render_source(tmp_path):
+    with cd(copy_project('incremental', tmp_path)):
+        proj = project.build()
+        p = proj.processor
+        info = proj.filelist[0]
+        for src in ['text\n', 'a\r\nb\n\n', '', '{ x }\n']:
+            expected = p.env.from_string(src).render(this=info, site=proj.site)
+            assert p.render_source(src, info) == expected
+        src = '{{ this.title }} {# comment #}\n'
+        assert p.render_source(src, info) == info['title'] + ' '
+        # from the cache
+        assert p.render_source(src, info) == info['title'] + ' '
+        assert os.listdir(os.path.join('.urubu_cache', 'templates'))
+
+def test_conversion_cache(tmp_path):
+    with cd(copy_project('incremental', tmp_path)):
+        project.build()
+        with open(os.path.join('_build', 'page.html')) as f:
+            assert '>other</a>' in f.read()
+        # a build without a manifest reuses the cached conversions,
+        # unless a reflink that a page uses has changed
+        edit('other.md', 'title: other', 'title: renamed')
+        os.remove(os.path.join('_build', '.urubu_manifest.json'))
+        project.build()
+        with open(os.path.join('_build', 'page.html')) as f:
+            assert '>renamed</a>' in f.read()
+        shutil.copytree('_build', '_cached')
+        os.remove(os.path.join('_build', '.urubu_manifest.json'))
+        project.build()
+        assert same_trees('_build', '_cached')
+        # a clean build clears the caches
+        bad = os.path.join('.urubu_cache', 'markdown', 'bad')
+        with open(bad, 'w') as f:
+            f.write('bad')
+        project.build(clean=True)
+        assert not os.path.exists(bad)
+        assert same_trees('_build', '_cached')
+
+def test_pagination(tmp_path):
+    with cd(copy_project('pagination', tmp_path)):
+        project.build()
+        def main(fn):
+            with open(os.path.join('_build', fn)) as f:
+                s = f.read()
+            return s[s.index('<main>'):s.index('</main>')]
+        assert '<p>item1,item2,</p>' in main(os.path.join('news', 'index.html'))
+        s = main(os.path.join('news', 'index3.html'))
+        assert '<p>item5,</p>' in s
+        assert '<p>3/3 1 item5</p>' in s
+        assert 'next' not in s
+        s = main('archive2.html')
+        assert '<p>item4,item5,</p>' in s
+        assert 'href="/archive.html">prev' in s
+
+def test_stream(tmp_path):
+    with cd(copy_project('incremental', tmp_path)):
+        os.mkdir('tipuesearch')
+        project.build(clean=True)
+        shutil.copytree('_build', '_normal')
+        proj = project.build(clean=True, stream=True)
+        assert same_trees('_build', '_normal')
+        assert not isinstance(proj.filelist[0]['body'], str)
+        edit('other.md', 'The other page.', 'The edited other page.')
+        project.build(stream=True)
+        shutil.copytree('_build', '_stream')
+        project.build(clean=True)
+        assert same_trees('_build', '_stream')
+
+def test_stream_filters(tmp_path):
+    # spilled content is a plain string in templates
+    with cd(copy_project('incremental', tmp_path)):
+        edit(os.path.join('_layouts', 'page.html'), '{{this.body}}',
+             '{{this.body|e}} {{this.body|tojson}} {{this["toc"] is string}}')
+        project.build(clean=True)
+        shutil.copytree('_build', '_normal')
+        project.build(clean=True, stream=True)
+        assert same_trees('_build', '_normal')
+        with open(os.path.join('_build', 'other.html')) as f:
+            page = f.read()
+        assert '&lt;p&gt;The other page.&lt;/p&gt;' in page
+        assert '"\\u003cp\\u003eThe other page.' in page
+        assert 'True' in page
+
+def test_stream_project_filters(tmp_path, monkeypatch):
+    # project filters get plain strings in streaming mode too
+    with cd(copy_project('incremental', tmp_path)):
+        monkeypatch.syspath_prepend(os.getcwd())
+        with open('_python.py', 'w') as f:
+            f.write('def bodies(items):\n'
+                    '    return " ".join(item["body"] for item in items)\n'
+                    'filters = {"bodies": bodies}\n')
+        with open(os.path.join('_layouts', 'index.html'), 'w') as f:
+            f.write('<main>{{this.content|bodies}}</main>\n')
+        try:
+            project.build(clean=True, stream=True)
+            edit('other.md', 'The other page.', 'The edited other page.')
+            project.build(stream=True)
+            shutil.copytree('_build', '_stream')
+            project.build(clean=True)
+        finally:
+            sys.modules.pop('_python', None)
+        assert same_trees('_build', '_stream')
+        with open(os.path.join('_build', 'index.html')) as f:
+            assert 'The edited other page.' in f.read()
+
+def test_precompress(tmp_path):
+    with cd(copy_project('incremental', tmp_path)):
+        with open('_site.yml', 'a') as f:
+            f.write('precompress: true\n')
+        os.mkdir('css')
+        with open(os.path.join('css', 'style.css'), 'w') as f:
+            f.write('p { color: red; }\n' * 200)
+        with open('small.css', 'w') as f:
+            f.write('p {}\n')
+        project.build()
+        gz = os.path.join('_build', 'css', 'style.css.gz')
+        with gzip.open(gz) as f:
+            assert f.read() == b'p { color: red; }\n' * 200
+        assert not os.path.exists(os.path.join('_build', 'small.css.gz'))
+        # unchanged sources are not compressed again
+        os.utime(gz, ns=(0, 0))
+        project.build()
+        assert os.stat(gz).st_mtime_ns == 0
+        os.remove(os.path.join('css', 'style.css'))
+        project.build()
+        assert not os.path.exists(gz)
+
+def test_ignored_dirs(tmp_path):
+    with cd(copy_project('incremental', tmp_path)):
+        with open('_site.yml', 'a') as f:
+            f.write('ignore_patterns: [vendor]\n')
+        # files below an ignored folder are ignored too
+        os.makedirs(os.path.join('vendor', 'pkg'))
+        with open(os.path.join('vendor', 'pkg', 'README.md'), 'w') as f:
+            f.write('no front matter\n')
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', UrubuWarning)
+            proj = project.build()
+        assert sorted(info['fn'] for info in proj.filelist) == ['index.md', 'other.md', 'page.md']
+        info = proj.filelist[0]
+        assert info['mdate'] == datetime.date.fromtimestamp(os.path.getmtime(info['fn']))
+
+def test_discovery_threads(tmp_path):
+    # frontmatter is read concurrently, but merged in walk order
+    results = []
+    for threads in (1, 4):
+        with cd(copy_project('navtree', tmp_path / str(threads))):
+            with open('_site.yml', 'a') as f:
+                f.write('discovery_threads: {}\n'.format(threads))
+            proj = project.build(clean=True)
+            results.append(([info['id'] for info in proj.filelist],
+                            [info['id'] for info in proj.navlist],
+                            proj.sources, proj.contenthash))
+    assert results[0] == results[1]
+    serial = os.path.join(str(tmp_path), '1', 'navtree', '_build')
+    threaded = os.path.join(str(tmp_path), '4', 'navtree', '_build')
+    assert same_trees(serial, threaded)
+
+def count_reads(monkeypatch):
+    reads = []
+    read_yamlfm = readers.read_yamlfm
+    def counting(fn, *args, **kwargs):
+        reads.append(fn)
+        return read_yamlfm(fn, *args, **kwargs)
+    monkeypatch.setattr(readers, 'read_yamlfm', counting)
+    return reads
+
+def test_index(tmp_path, monkeypatch):
+    def get_graph(proj):
+        return ([info['id'] for info in proj.filelist],
+                [info['id'] for info in proj.navlist],
+                [info['id'] for info in proj.site['reflinks']['/index']['content']],
+                proj.layouts, proj.contenthash)
+    with cd(copy_project('incremental', tmp_path)):
+        project.build()
+        reads = count_reads(monkeypatch)
+        processed = []
+        monkeypatch.setattr(project.Project, 'process_info',
+                            lambda self, info, site: processed.append(info['fn']))
+        proj = project.load(content=True)
+        # unchanged files are not read again, but their info is made again
+        assert reads == []
+        assert sorted(processed) == ['index.md', 'other.md', 'page.md']
+        graph = get_graph(proj)
+        assert sorted(graph[0]) == ['/index', '/other', '/page']
+        assert graph[2] == ['/page', '/other']
+        with open('other.md', 'a') as f:
+            f.write('More text.\n')
+        proj = project.load(content=True)
+        assert reads == ['other.md']
+        assert get_graph(proj) == graph
+        # the frontmatter doesn't depend on the site info
+        with open('_site.yml', 'a') as f:
+            f.write('baseurl: base\n')
+        del reads[:]
+        proj = project.load(content=True)
+        assert reads == []
+        assert proj.site['reflinks']['/page']['url'] == '/base/page.html'
+
+def test_index_query(tmp_path):
+    with cd(copy_project('incremental', tmp_path)):
+        project.load(content=True)
+        index = ProjectIndex(os.path.join('.urubu_cache', 'index.sqlite'))
+        assert index.find_reflinks('/p') == [('/page', 'page', '/page.html')]
+        os.remove('page.md')
+        edit('index.md', '[page, other]', '[other]')
+        project.load(content=True)
+        assert index.find_reflinks('/p') == []
+        # reflinks are updated when the site info changes
+        with open('_site.yml', 'a') as f:
+            f.write('baseurl: base\n')
+        project.load(content=True)
+        assert index.find_reflinks('/o') == [('/other', 'other', '/base/other.html')]
+        assert [id for id, title, url in index.find_reflinks()] == ['/', '/index', '/other']
+
+def test_hooks_module(tmp_path):
+    # a _python.py hook module is part of the build state
+    with cd(copy_project('incremental', tmp_path)):
+        before = manifest.hash_hooks()
+        with open('_python.py', 'w') as f:
+            f.write('filters = {}\n')
+        module = manifest.hash_hooks()
+        assert module != before
+        with open('_python.py', 'w') as f:
+            f.write('filters = {"upper": str.upper}\n')
+        assert manifest.hash_hooks() != module
+
+def test_compile_patterns(monkeypatch):
+    # patterns match as with fnmatch, also with a case insensitive platform
+    import ntpath
+    from urubu.sync import compile_patterns
+    patterns = ['Makefile', '*.md', 'vendor/pkg']
+    names = ['Makefile', 'makefile', 'README.MD', 'vendor/pkg', 'vendor\\pkg', 'page.html']
+    for normcase in (os.path.normcase, ntpath.normcase):
+        monkeypatch.setattr(os.path, 'normcase', normcase)
+        match = compile_patterns(patterns)
+        for name in names:
+            assert match(name) == any(fnmatch.fnmatch(name, p) for p in patterns)
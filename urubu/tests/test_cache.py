@@ -0,0 +1,59 @@
+import os, time
+import markdown
+
+from urubu import md_extensions
+from urubu.cache import MemoryCache, DiskCache, Cache, make_key
+
+def test_make_key():
+    assert make_key('ab', 'c') != make_key('a', 'bc')
+    assert make_key('ab', 'c') == make_key('ab', 'c')
+
+def test_memory_cache():
+    cache = MemoryCache(10)
+    cache.put('a', 'A', 4)
+    cache.put('b', 'B', 4)
+    # mark a as recently used, so that b is evicted
+    assert cache.get('a') == 'A'
+    cache.put('c', 'C', 4)
+    assert cache.get('b') is None
+    assert cache.get('a') == 'A'
+    assert cache.get('c') == 'C'
+    assert cache.size == 8
+
+def test_disk_cache(tmp_path):
+    path = str(tmp_path)
+    cache = DiskCache(path, 100)
+    for i in range(4):
+        key = make_key(str(i))
+        cache.put(key, b'x' * 30)
+        # distinct modification times for eviction order
+        t = time.time() - 100 + i
+        os.utime(cache.get_fn(key), (t, t))
+    assert cache.get(make_key('0')) is None
+    assert cache.get(make_key('3')) == b'x' * 30
+    assert cache.size <= 75
+    # a new instance sees the stored values
+    assert DiskCache(path, 100).get(make_key('3')) == b'x' * 30
+
+def test_cache(tmp_path):
+    path = str(tmp_path)
+    cache = Cache(path, 100, 100, str.encode, bytes.decode)
+    cache.put('k', 'value')
+    assert Cache(path, 100, 100, str.encode, bytes.decode).get('k') == 'value'
+    assert Cache(None, 100, 100, str.encode, bytes.decode).get('k') is None
+
+def test_hilite_cache():
+    md = markdown.Markdown(extensions=['markdown.extensions.fenced_code',
+                                       'markdown.extensions.codehilite'])
+    src = '```python\nx = 1\n```\n\n    :::python\n    y = 2\n\n    z = 3\n'
+    md_extensions.set_hilite_cache(None)
+    expected = md.reset().convert(src)
+    cache = Cache(None, 1024 * 1024, 0, str.encode, bytes.decode)
+    md_extensions.set_hilite_cache(cache)
+    try:
+        assert md.reset().convert(src) == expected
+        assert len(cache.memory.items) == 2
+        assert md.reset().convert(src) == expected
+        assert len(cache.memory.items) == 2
+    finally:
+        md_extensions.set_hilite_cache(None)
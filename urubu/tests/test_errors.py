@@ -1,78 +1,98 @@
-import os 
+import os
 from urubu import UrubuError, project
 from urubu.project import _error
 
-from urubu.tests import cd, raises_kind
+from urubu.tests import cd, copy_project, raises_kind
 
-def test_undef_reflink_title():
-    with cd('undef_reflink_title'):
+def test_undef_reflink_title(tmp_path):
+    with cd(copy_project('undef_reflink_title', tmp_path)):
         with raises_kind(UrubuError, _error.undef_reflink_key):
             project.build()
 
-def test_undef_reflink_url():
-    with cd('undef_reflink_url'):
+def test_undef_reflink_url(tmp_path):
+    with cd(copy_project('undef_reflink_url', tmp_path)):
         with raises_kind(UrubuError, _error.undef_reflink_key):
             project.build()
 
-def test_ambig_ref_md():
-    with cd('ambig_ref_md'):
+def test_ambig_ref_md(tmp_path):
+    with cd(copy_project('ambig_ref_md', tmp_path)):
         with raises_kind(UrubuError, _error.ambig_ref_md):
             project.build()
 
-def test_ambig_refid():
-    with cd('ambig_refid'):
+def test_ambig_ref_md_jobs(tmp_path):
+    with cd(copy_project('ambig_ref_md', tmp_path)):
+        with raises_kind(UrubuError, _error.ambig_ref_md):
+            project.build(clean=True, jobs=2)
+
+def test_ambig_refid(tmp_path):
+    with cd(copy_project('ambig_refid', tmp_path)):
         with raises_kind(UrubuError, _error.ambig_refid):
             project.build()
 
-def test_ambig_ref():
-    with cd('ambig_ref'):
+def test_ambig_ref(tmp_path):
+    with cd(copy_project('ambig_ref', tmp_path)):
         with raises_kind(UrubuError, _error.ambig_ref):
             project.build()
 
-def test_date_format():
-    with cd('date_format'):
+def test_date_format(tmp_path):
+    with cd(copy_project('date_format', tmp_path)):
         with raises_kind(UrubuError, _error.date_format):
             project.build()
 
-def test_undef_reflink_title():
-    with cd('undef_reflink_title'):
+def test_undef_reflink_title(tmp_path):
+    with cd(copy_project('undef_reflink_title', tmp_path)):
         with raises_kind(UrubuError, _error.undef_reflink_key):
             project.build()
 
-def test_undef_reflink_url():
-    with cd('undef_reflink_url'):
+def test_undef_reflink_url(tmp_path):
+    with cd(copy_project('undef_reflink_url', tmp_path)):
         with raises_kind(UrubuError, _error.undef_reflink_key):
             project.build()
 
-def test_ignore_patterns():
-    with cd('ignore_patterns'):
+def test_ignore_patterns(tmp_path):
+    with cd(copy_project('ignore_patterns', tmp_path)):
         project.build()
         assert not os.path.exists(os.path.join('_build', 'README.html'))
         assert os.path.exists(os.path.join('_build', 'page.html'))
 
-def test_undef_content():
-    with cd('undef_content'):
+def test_undef_content(tmp_path):
+    with cd(copy_project('undef_content', tmp_path)):
         with raises_kind(UrubuError, _error.undef_content):
             project.build()
 
-def test_undef_key():
-    with cd('undef_key'):
+def test_undef_key(tmp_path):
+    with cd(copy_project('undef_key', tmp_path)):
         with raises_kind(UrubuError, _error.undef_key):
             project.build()
 
-def test_undef_layout():
-    with cd('undef_layout'):
+def test_undef_layout(tmp_path):
+    with cd(copy_project('undef_layout', tmp_path)):
         with raises_kind(UrubuError, _error.undef_info):
             project.build()
 
-def test_undef_ref():
-    with cd('undef_ref'):
+def test_undef_ref(tmp_path):
+    with cd(copy_project('undef_ref', tmp_path)):
         with raises_kind(UrubuError, _error.undef_ref):
             project.build()
 
-def test_no_index():
-    with cd('no_index'):
+def test_no_index(tmp_path):
+    with cd(copy_project('no_index', tmp_path)):
         with raises_kind(UrubuError, _error.no_index):
             project.build()
 
 
+
+def test_ambig_ref_discovery_threads(tmp_path):
+    with cd(copy_project('ambig_ref', tmp_path)):
+        with open('_site.yml', 'a') as f:
+            f.write('discovery_threads: 4\n')
+        with raises_kind(UrubuError, _error.ambig_ref):
+            project.build()
+
+def test_invalid_discovery_threads(tmp_path):
+    for value in ('four', 'null', '0', 'true'):
+        with cd(copy_project('ambig_ref', tmp_path / value)):
+            with open('_site.yml', 'a') as f:
+                f.write('discovery_threads: {}\n'.format(value))
+            with raises_kind(UrubuError, _error.invalid_value):
+                project.build()
@@ -0,0 +1,33 @@
+import os, sys, subprocess
+
+from urubu.tests import cd
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+# libraries that are only needed to process content
+heavy = ('markdown', 'jinja2', 'pygments', 'urubu.processors', 'http.server')
+
+def get_imports(code):
+    """Return the modules imported by code, from python -X importtime."""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([os.path.dirname(os.path.dirname(here))] + sys.path)
+    p = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                       env=env, capture_output=True, text=True, check=True)
+    modules = set()
+    for line in p.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            modules.add(line.rsplit('|', 1)[1].strip())
+    return modules
+
+def test_main_imports():
+    modules = get_imports('import urubu.main')
+    assert 'urubu.project' in modules
+    for name in heavy:
+        assert name not in modules
+
+def test_load_imports():
+    # serving only needs the site info
+    with cd(os.path.join(here, 'incremental')):
+        modules = get_imports('from urubu import project; project.load()')
+    for name in heavy:
+        assert name not in modules
@@ -0,0 +1,76 @@
+import os
+
+from urubu import project
+from urubu.links import scan_html, LinkChecker
+
+from urubu.tests import cd, copy_project
+
+page = '''<html>
+<head><link rel="stylesheet" href="/base/css/style.css"></head>
+<body>
+<h2 id="intro">Intro</h2>
+<a name="old"></a>
+<a href="other#part">ok</a> <a href='other.html#nopart'>missing anchor</a>
+<img src="img/a.png" alt="">
+<a href="/base/sub/">ok</a> <a href="/sub/">outside baseurl</a>
+<a href="../up.html">outside site</a>
+<a href="https://example.com/x">external</a> <a href="mailto:me@example.com">mail</a>
+<a href="#intro">ok</a> <a href="#old">ok</a> <a href="gone.html">missing</a>
+<script>var s = '<a href="script.html">';</script>
+<!-- <a href="comment.html"> -->
+</body>
+</html>
+'''
+
+def test_scan_html():
+    links, ids = scan_html(page)
+    assert ids == ['intro', 'old']
+    assert links[0] == (2, '/base/css/style.css')
+    assert (6, 'other.html#nopart') in links
+    urls = [url for line, url in links]
+    assert 'script.html' not in urls
+    assert 'comment.html' not in urls
+
+def test_check_links(tmp_path):
+    files = {'index.html': page,
+             'other.html': '<p id="part"></p>',
+             os.path.join('sub', 'index.html'): '',
+             os.path.join('css', 'style.css'): '',
+             os.path.join('img', 'a.png'): ''}
+    for fn, s in files.items():
+        p = tmp_path / fn
+        p.parent.mkdir(exist_ok=True)
+        p.write_text(s)
+    for jobs in (1, 2):
+        checker = LinkChecker(str(tmp_path), baseurl='base', jobs=jobs)
+        broken = [(url, reason) for fn, line, url, reason in checker.check()]
+        assert broken == [('other.html#nopart', 'missing anchor'),
+                          ('/sub/', 'outside baseurl'),
+                          ('../up.html', 'outside site'),
+                          ('gone.html', 'missing target')]
+
+def test_check_links_ignored(tmp_path):
+    files = {'index.html': '<a href="_vendor/x.html">x</a> <a href="sub/">sub</a>',
+             os.path.join('.git', 'HEAD.html'): '<a href="nowhere.html">x</a>',
+             os.path.join('_vendor', 'x.html'): '',
+             os.path.join('sub', '.cache', 'y.html'): '<a href="nowhere.html">y</a>',
+             os.path.join('sub', 'index.html'): ''}
+    for fn, s in files.items():
+        p = tmp_path / fn
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(s)
+    checker = LinkChecker(str(tmp_path), ignore_patterns=('.?*', '_*'))
+    broken = [(page, url, reason) for page, line, url, reason in checker.check()]
+    assert broken == [('index.html', '_vendor/x.html', 'missing target')]
+    assert sorted(checker.ids) == ['index.html', 'sub/index.html']
+
+def test_check_links_project(tmp_path, capsys):
+    with cd(copy_project('incremental', tmp_path)):
+        project.build()
+        with open(os.path.join('_build', 'other.html'), 'a') as f:
+            f.write('<a href="gone.html">gone</a>\n')
+        broken, npages = project.check_links()
+        assert [(page, url) for page, line, url, reason in broken] == [('other.html', 'gone.html')]
+        assert npages == 3
+        # reporting is left to the command
+        assert capsys.readouterr().out == ''
@@ -0,0 +1,53 @@
+from urubu.minify import minify_html
+
+html = '''<!DOCTYPE html>
+<html>
+  <head>
+    <!-- dropped -->
+    <!--[if lt IE 9]><script src="ie.js"></script><![endif]-->
+    <style>
+      p  {  color: red; }
+    </style>
+  </head>
+  <body>
+    <p title="a   b">Some   text,&nbsp; a < b  and  c</p>
+    <div class="codehilite"><pre><span></span>def f():
+    return  1
+</pre></div>
+    <textarea>  x   y </textarea>
+    <script>if (a<b) { x = "</p>"; }</script>
+  </body>
+</html>
+'''
+
+expected = '''<!DOCTYPE html>
+<html>
+<head>
+<!--[if lt IE 9]><script src="ie.js"></script><![endif]-->
+<style>
+      p  {  color: red; }
+    </style>
+</head>
+<body>
+<p title="a   b">Some text,&nbsp; a < b and c</p>
+<div class="codehilite"><pre><span></span>def f():
+    return  1
+</pre></div>
+<textarea>  x   y </textarea>
+<script>if (a<b) { x = "</p>"; }</script>
+</body>
+</html>
+'''
+
+def test_minify():
+    assert ''.join(minify_html([html])) == expected
+
+def test_minify_chunks():
+    # the result doesn't depend on how the html is split
+    for n in range(1, 8):
+        chunks = [html[i:i+n] for i in range(0, len(html), n)]
+        assert ''.join(minify_html(chunks)) == expected
+
+def test_minify_unterminated():
+    assert ''.join(minify_html(['<p>a  <!-- open'])) == '<p>a <!-- open'
+    assert ''.join(minify_html(['<pre>  a  '])) == '<pre>  a  '
@@ -0,0 +1,39 @@
+import os, datetime
+import yaml
+
+from urubu import readers
+from urubu.processors import skip_yamlfm
+
+sources = {
+    'plain.md': b'---\ntitle: plain\n---\nA body\n---\nwith a rule.\n',
+    'crlf.md': b'\xef\xbb\xbf---\r\ntitle: crlf\r\n---\r\nA body \xc3\xa9\r\n',
+    'empty.md': b'---\ntitle: empty\n---\n',
+}
+
+def write_sources(tmp_path):
+    for fn, data in sources.items():
+        with open(os.path.join(str(tmp_path), fn), 'wb') as f:
+            f.write(data)
+
+def test_read_yamlfm(tmp_path):
+    write_sources(tmp_path)
+    for fn in sources:
+        fn = os.path.join(str(tmp_path), fn)
+        meta, pos, body = readers.read_yamlfm(fn)
+        assert meta == readers.get_yamlfm(fn)
+        with open(fn, encoding='utf-8-sig') as f:
+            assert body == skip_yamlfm(f)
+        assert readers.read_body(fn, pos) == body
+
+def test_read_yamlfm_maxbody(tmp_path):
+    write_sources(tmp_path)
+    fn = os.path.join(str(tmp_path), 'plain.md')
+    meta, pos, body = readers.read_yamlfm(fn, maxbody=10)
+    assert meta == {'title': 'plain'}
+    assert body is None
+    assert readers.read_body(fn, pos) == 'A body\n---\nwith a rule.\n'
+
+def test_load_yaml():
+    s = 'date: 2015-03-01\ncount: 3\nflag: yes\ntags: [a, b]\n'
+    assert readers.load_yaml(s) == yaml.safe_load(s)
+    assert readers.load_yaml(s)['date'] == datetime.date(2015, 3, 1)
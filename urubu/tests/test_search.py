@@ -0,0 +1,80 @@
+import os, json, shutil, subprocess
+import pytest
+
+from urubu import UrubuError
+from urubu.search import extract_text, truncate_text, get_shard, SearchIndex
+
+def test_extract_text():
+    html = ('<html><body><p>Skipped</p><main><h1>A &amp; B</h1>'
+            '<script>var x = 1;</script><!-- comment -->'
+            '<p> Some\n text <em>here</em>.</p></main>'
+            '<main>Second</main></body></html>')
+    assert extract_text(html) == 'A & B Some\n text here .'
+
+def test_extract_text_no_main():
+    assert extract_text('<html><body><p>Text</p></body></html>') == ''
+
+def test_truncate_text():
+    assert truncate_text('some words here', 100) == 'some words here'
+    assert truncate_text('some words here', 12) == 'some words'
+    assert truncate_text('somewords', 4) == 'some'
+    assert truncate_text('some words', None) == 'some words'
+
+def test_search_index(tmp_path):
+    index = SearchIndex(prefix_length=2, text_limit=10)
+    index.add({'title': 'First', 'url': '/first.html', 'tags': 'tag',
+               'text': 'First page about things'})
+    index.add({'title': 'Second', 'url': '/second.html', 'tags': '',
+               'text': 'Second page about other things'})
+    path = os.path.join(str(tmp_path), 'search')
+    index.write(path)
+    with open(os.path.join(path, 'index.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    assert meta['docs'] == [['First', '/first.html', 'First page'],
+                            ['Second', '/second.html', 'Second']]
+    assert get_shard('page', 2) in meta['shards']
+    with open(os.path.join(path, get_shard('page', 2) + '.json')) as f:
+        shard = json.load(f)
+    assert shard == {'page': [0, 1, 1, 1]}
+    with open(os.path.join(path, get_shard('first', 2) + '.json')) as f:
+        shard = json.load(f)
+    assert shard == {'first': [0, 11]}
+    assert os.path.exists(os.path.join(path, 'search.js'))
+
+def test_search_index_folder(tmp_path):
+    # a folder that is not a search index is never replaced
+    path = os.path.join(str(tmp_path), 'search')
+    os.makedirs(path)
+    with open(os.path.join(path, 'index.html'), 'w') as f:
+        f.write('user content')
+    with pytest.raises(UrubuError):
+        SearchIndex().write(path)
+    assert os.path.exists(os.path.join(path, 'index.html'))
+
+# run the client loader with node, fetching from the file system
+search_script = '''
+const fs = require('fs');
+global.fetch = (fn) => Promise.resolve({ok: true, status: 200,
+    json: () => JSON.parse(fs.readFileSync(fn, 'utf8'))});
+eval(fs.readFileSync(process.argv[1], 'utf8'));
+new UrubuSearch(process.argv[2]).search(process.argv[3]).then((results) => {
+    console.log(JSON.stringify(results.map((r) => r.url)));
+});
+'''
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not available')
+def test_search_js(tmp_path):
+    index = SearchIndex(prefix_length=3)
+    index.add({'title': 'Python', 'url': '/py.html', 'tags': '', 'text': 'pygments'})
+    index.add({'title': 'Perl', 'url': '/pl.html', 'tags': '', 'text': 'python too'})
+    path = os.path.join(str(tmp_path), 'search')
+    index.write(path)
+    def search(query):
+        p = subprocess.run(['node', '-e', search_script, '--',
+                            os.path.join(path, 'search.js'), path, query],
+                           capture_output=True, text=True, check=True)
+        return sorted(json.loads(p.stdout))
+    # terms shorter than the prefix length match in all their shards
+    assert search('py') == ['/pl.html', '/py.html']
+    assert search('pyg') == ['/py.html']
+    assert search('pe py') == ['/pl.html']
@@ -0,0 +1,93 @@
+import os, gzip, functools, threading, http.client
+import http.server as httpserver
+
+import pytest
+
+from urubu.httphandler import AliasingHTTPRequestHandler, parse_range, accepts_gzip
+
+@pytest.fixture
+def server(tmp_path):
+    site = tmp_path / 'site'
+    (site / 'sub').mkdir(parents=True)
+    (site / 'index.html').write_bytes(b'<p>home</p>')
+    (site / 'sub' / 'index.html').write_bytes(b'<p>sub</p>')
+    (site / 'big.bin').write_bytes(bytes(range(256)) * 1024)
+    (site / 'style.css').write_bytes(b'p { color: red; }')
+    (site / 'style.css.gz').write_bytes(gzip.compress(b'p { color: red; }'))
+    handler = functools.partial(AliasingHTTPRequestHandler, directory=str(site))
+    httpd = httpserver.ThreadingHTTPServer(('localhost', 0), handler)
+    httpd.baseurl = 'base'
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    conn = http.client.HTTPConnection('localhost', httpd.server_address[1])
+    yield conn
+    conn.close()
+    httpd.shutdown()
+    httpd.server_close()
+
+def get(conn, path, **headers):
+    conn.request('GET', path, headers=headers)
+    response = conn.getresponse()
+    return response, response.read()
+
+def test_parse_range():
+    assert parse_range('bytes=0-9', 100) == (0, 10)
+    assert parse_range('bytes=90-', 100) == (90, 10)
+    assert parse_range('bytes=-10', 100) == (90, 10)
+    assert parse_range('bytes=95-200', 100) == (95, 5)
+    assert parse_range('bytes=100-', 100) == (100, 0)
+    assert parse_range('bytes=0-1,5-6', 100) is None
+    assert parse_range('lines=0-1', 100) is None
+
+def test_accepts_gzip():
+    assert accepts_gzip('gzip, deflate, br')
+    assert accepts_gzip('deflate;q=1.0, *;q=0.5')
+    assert not accepts_gzip('gzip;q=0')
+    assert not accepts_gzip('')
+
+def test_keep_alive(server):
+    # the same connection serves a redirect and several files
+    response, body = get(server, '/base')
+    assert response.status == 301
+    assert response.getheader('Location') == '/base/'
+    response, body = get(server, '/index.html')
+    assert response.status == 302
+    response, body = get(server, '/base/')
+    assert body == b'<p>home</p>'
+    response, body = get(server, '/base/sub/')
+    assert body == b'<p>sub</p>'
+
+def test_conditional(server):
+    response, body = get(server, '/base/index.html')
+    etag = response.getheader('ETag')
+    last_modified = response.getheader('Last-Modified')
+    response, body = get(server, '/base/index.html', **{'If-None-Match': etag})
+    assert response.status == 304
+    assert body == b''
+    response, body = get(server, '/base/index.html', **{'If-Modified-Since': last_modified})
+    assert response.status == 304
+    response, body = get(server, '/base/index.html', **{'If-None-Match': '"other"'})
+    assert response.status == 200
+
+def test_range(server):
+    response, body = get(server, '/base/big.bin', Range='bytes=256-511')
+    assert response.status == 206
+    assert response.getheader('Content-Range') == 'bytes 256-511/262144'
+    assert body == bytes(range(256))
+    # large enough to be sent with sendfile
+    response, body = get(server, '/base/big.bin', Range='bytes=1-')
+    assert response.status == 206
+    assert body == (bytes(range(256)) * 1024)[1:]
+    response, body = get(server, '/base/big.bin', Range='bytes=300000-')
+    assert response.status == 416
+    response, body = get(server, '/base/big.bin', Range='bytes=0-9', **{'If-Range': '"other"'})
+    assert response.status == 200
+    assert len(body) == 262144
+
+def test_gzip(server):
+    response, body = get(server, '/base/style.css', **{'Accept-Encoding': 'gzip'})
+    assert response.getheader('Content-Encoding') == 'gzip'
+    assert response.getheader('Vary') == 'Accept-Encoding'
+    assert gzip.decompress(body) == b'p { color: red; }'
+    response, body = get(server, '/base/style.css')
+    assert response.getheader('Content-Encoding') is None
+    assert body == b'p { color: red; }'
@@ -2,36 +2,50 @@ import os
 import pytest
 from urubu import UrubuWarning, _warning, project
 
-from urubu.tests import cd
+from urubu.tests import cd, copy_project
 
-def test_no_yamlfm():
-    with cd('no_yamlfm'):
+def test_no_yamlfm(tmp_path):
+    with cd(copy_project('no_yamlfm', tmp_path)):
         with pytest.warns(UrubuWarning) as record:
             project.build()
         print (record)
         assert len(record) == 1
         assert _warning.no_yamlfm in str(record[0].message)
 
-def test_undef_tag_layout():
-    with cd('undef_tag_layout'):
+def test_undef_tag_layout(tmp_path):
+    with cd(copy_project('undef_tag_layout', tmp_path)):
         with pytest.warns(UrubuWarning) as record:
             project.build()
         print (record)
         assert len(record) == 1
         assert _warning.undef_tag_layout in str(record[0].message)
 
-def test_undef_ref_md():
-    with cd('undef_ref_md'):
+def test_undef_ref_md(tmp_path):
+    with cd(copy_project('undef_ref_md', tmp_path)):
         with pytest.warns(UrubuWarning) as record:
             project.build()
         print (record)
         assert len(record) == 1
         assert _warning.undef_ref_md in str(record[0].message)
 
-def test_undef_anchor():
-    with cd('undef_anchor'):
+def test_undef_anchor(tmp_path):
+    with cd(copy_project('undef_anchor', tmp_path)):
         with pytest.warns(UrubuWarning) as record:
             project.build()
         assert len(record) == 1
         assert _warning.undef_anchor in str(record[0].message)
 
+
+def test_undef_ref_md_jobs(tmp_path):
+    with cd(copy_project('undef_ref_md', tmp_path)):
+        with pytest.warns(UrubuWarning) as record:
+            project.build(clean=True, jobs=2)
+        assert len(record) == 1
+        assert _warning.undef_ref_md in str(record[0].message)
+
+def test_undef_anchor_jobs(tmp_path):
+    with cd(copy_project('undef_anchor', tmp_path)):
+        with pytest.warns(UrubuWarning) as record:
+            project.build(clean=True, jobs=2)
+        assert len(record) == 1
+        assert _warning.undef_anchor in str(record[0].message)
@@ -0,0 +1,173 @@
+# Copyright 2026 Jan Decaluwe
+#
+# This file is part of Urubu.
+#
+# Urubu is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Urubu is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with Urubu.  If not, see <http://www.gnu.org/licenses/>.
+
+import os, sys
+import time
+import traceback
+import fnmatch
+import shutil
+
+from urubu import UrubuError, project
+from urubu.config import siteinfofn, layoutdir, sitedir
+
+
+def snapshot(top, skip):
+    """Return the modification time and size of all files in a tree.
+
+    Hidden directories, python caches and the directories in skip are
+    not scanned.
+    """
+    files = {}
+    stack = [top]
+    while stack:
+        path = stack.pop()
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name.startswith('.') or entry.name == '__pycache__':
+                        continue
+                    if entry.path in skip:
+                        continue
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    st = entry.stat()
+                    relfn = os.path.relpath(entry.path, top)
+                    files[relfn] = (st.st_mtime_ns, st.st_size)
+    return files
+
+
+def get_changes(old, new):
+    """Return the files that were added, removed or modified."""
+    return sorted(fn for fn in set(old) | set(new) if old.get(fn) != new.get(fn))
+
+
+class Watcher(object):
+
+    """Rebuild a site when its files change.
+
+    The project and its content processor are kept alive between builds.
+    Depending on the changed files, a build redoes only what is needed:
+
+    * changes to the site info or the python hooks reload the project;
+    * changes to layouts, and additions or removals of content files,
+      redo all phases, reusing unchanged conversions and renderings;
+    * changes to the body of content files only convert those files
+      again, and render the pages that depend on them;
+    * changes to other files only copy those files to the site.
+    """
+
+    def __init__(self, jobs=1, interval=0.5):
+        self.jobs = jobs
+        self.interval = interval
+        self.cwd = os.getcwd()
+        self.project = None
+        self.files = {}
+
+    def build(self, reload=False):
+        if reload or self.project is None:
+            # forget the previous python hooks
+            for name in list(sys.modules):
+                if name == '_python' or name.startswith('_python.'):
+                    del sys.modules[name]
+            self.project = project.load()
+        else:
+            self.project.reset()
+        project.make(self.project, jobs=self.jobs)
+
+    def update(self, changes):
+        proj = self.project
+        if proj is None:
+            return self.build()
+        pydir = '_python' + os.sep
+        # the hooks are a _python package or a _python.py module
+        if any(fn in (siteinfofn, '_python.py') or fn.startswith(pydir) for fn in changes):
+            return self.build(reload=True)
+        sitefiles = set(proj.infohashes)
+        content = [fn for fn in changes if fn.endswith('.md')]
+        other = [fn for fn in changes if not fn.endswith('.md')]
+        if any(fn.startswith(layoutdir + os.sep) for fn in other):
+            return self.build()
+        if content:
+            # only changes to the body of existing content files can be
+            # handled without processing the whole project again
+            changed = [fn for fn in content
+                       if fn in self.files and fn in sitefiles and os.path.isfile(fn)]
+            if len(changed) < len(content) or not proj.update_content(changed):
+                return self.build()
+        for fn in other:
+            self.copy_file(fn)
+
+    def copy_file(self, fn):
+        """Copy a changed file to the site, or remove it if it's gone."""
+        proj = self.project
+        ignore_patterns = proj.get_ignore_patterns() + ('*.md',)
+        if fn not in proj.get_keep_files():
+            for name in fn.split(os.sep):
+                if any(fnmatch.fnmatch(name, ip) for ip in ignore_patterns):
+                    return
+        sp = os.path.join(proj.sitedir, fn)
+        if os.path.isfile(fn):
+            os.makedirs(os.path.dirname(sp) or '.', exist_ok=True)
+            shutil.copy2(fn, sp)
+        elif os.path.isfile(sp):
+            os.remove(sp)
+        # a precompressed sibling is out of date until the next build
+        if proj.site.get('precompress') and os.path.isfile(sp + '.gz'):
+            os.remove(sp + '.gz')
+
+    def get_snapshot(self):
+        skip = set([os.path.join(self.cwd, sitedir)])
+        if self.project is not None:
+            skip.add(os.path.join(self.cwd, self.project.sitedir))
+        return snapshot(self.cwd, skip)
+
+    def run(self):
+        """Build the site, and rebuild it on changes, forever."""
+        self.start()
+        self.loop()
+
+    def start(self):
+        self.rebuild(None)
+        self.files = self.get_snapshot()
+
+    def loop(self):
+        while True:
+            time.sleep(self.interval)
+            files = self.get_snapshot()
+            changes = get_changes(self.files, files)
+            if changes:
+                self.rebuild(changes)
+                self.files = files
+
+    def rebuild(self, changes):
+        start = time.time()
+        try:
+            if changes is None:
+                self.build()
+            else:
+                self.update(changes)
+        except Exception as e:
+            # keep watching, and start from scratch after an error
+            self.project = None
+            if isinstance(e, UrubuError):
+                print("Error: {}".format(e), file=sys.stderr)
+            else:
+                traceback.print_exc()
+            return
+        if changes is not None:
+            print("Rebuilt for {} changed file(s) in {:.3f}s".format(
+                len(changes), time.time() - start))